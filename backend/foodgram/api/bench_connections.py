@@ -0,0 +1,92 @@
+import copy
+import statistics
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.utils import load_backend
+
+from api.instrumentation import percentile
+from recipes.models import Tag
+
+
+def connection_modes():
+    '''Режимы соединений для замера: у PostgreSQL ещё проверки и пул'''
+    if connection.vendor == 'postgresql':
+        return ('new', 'persistent', 'persistent+checks', 'pool')
+    return ('new', 'persistent')
+
+
+def connection_settings(mode, pool_size):
+    settings_dict = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+    settings_dict['OPTIONS'].pop('pool', None)
+    settings_dict.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    if connection.vendor == 'postgresql':
+        settings_dict['ENGINE'] = 'foodgram.postgresql'
+    if mode.startswith('persistent'):
+        settings_dict['CONN_MAX_AGE'] = 600
+    if mode in ('persistent+checks', 'pool'):
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+    if mode == 'pool':
+        settings_dict['OPTIONS']['pool'] = {'max_size': pool_size}
+    return settings_dict
+
+
+def simulate_requests(settings_dict, alias, repeat, sql, timings, errors):
+    '''Запросы с одним SQL-запросом: соединение обслуживается так же, как
+    сигналами request_started и request_finished'''
+    wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(
+        settings_dict, alias
+    )
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.fetchall()
+            wrapper.close_if_unusable_or_obsolete()
+            timings.append((time.perf_counter() - start) * 1000)
+    except Exception as error:
+        errors.append(error)
+    finally:
+        wrapper.close()
+
+
+def measure_connections(repeat, threads, pool_size):
+    '''Время запроса с новым соединением, постоянным и из пула
+
+    Каждый поток — как поток воркера gthread или ASGI со своей обёрткой
+    соединения; в режиме pool потоки делят pool_size соединений.
+    '''
+    sql = f'SELECT id, name FROM {Tag._meta.db_table} ORDER BY id LIMIT 10'
+    results = {}
+    for mode in connection_modes():
+        alias = f'bench_{mode}'
+        settings_dict = connection_settings(mode, pool_size)
+        timings, errors = [], []
+        workers = [
+            threading.Thread(target=simulate_requests, args=(
+                settings_dict, alias, repeat, sql, timings, errors
+            ))
+            for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if mode == 'pool':
+            from foodgram.postgresql.base import close_pool
+            close_pool(alias)
+        if errors:
+            raise errors[0]
+        timings.sort()
+        results[mode] = {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+        }
+    for measured in results.values():
+        measured['saved_ms'] = round(
+            results['new']['p50_ms'] - measured['p50_ms'], 3
+        )
+    return results
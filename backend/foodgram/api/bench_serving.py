@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+
+from api.instrumentation import percentile
+from recipes.models import Ingredients, Recipe
+
+
+def hot_paths():
+    '''Адреса частых чтений для нагрузочного замера, без авторизации'''
+    recipe = Recipe.objects.values_list('id', flat=True).first()
+    ingredient = Ingredients.objects.values_list('name', flat=True).first()
+    paths = ['/api/recipes/', '/api/tags/']
+    if recipe is not None:
+        paths.append(f'/api/recipes/{recipe}/')
+    if ingredient is not None:
+        paths.append(f'/api/ingredients/?name={quote(ingredient[:3])}')
+    return paths
+
+
+def server_command(mode, port, workers, threads):
+    '''gunicorn в режиме sync, gthread (потоки) или asgi (uvicorn)'''
+    application = 'foodgram.asgi' if mode == 'asgi' else 'foodgram.wsgi'
+    # python -m gunicorn работает только с gunicorn 20.1
+    command = [
+        sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+        f'{application}:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        '--log-level', 'warning',
+    ]
+    if mode == 'gthread':
+        command += ['--threads', str(threads)]
+    elif mode == 'asgi':
+        command += ['-k', 'uvicorn.workers.UvicornWorker']
+    return command
+
+
+def start_server(mode, port, workers, threads, timeout=30):
+    process = subprocess.Popen(
+        server_command(mode, port, workers, threads), cwd=settings.BASE_DIR
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn ({mode}) завершился при запуске')
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({mode}) не открыл порт {port}')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def fetch(port, path):
+    '''Один GET без keep-alive: sync-воркеры gunicorn его не держат'''
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def load_client(port, paths, deadline, timings, errors):
+    loop = asyncio.get_event_loop()
+    for path in itertools.cycle(paths):
+        if loop.time() >= deadline:
+            return
+        start = loop.time()
+        try:
+            # Запрос, не завершённый через 5 с после конца замера,
+            # считается ошибкой
+            status = await asyncio.wait_for(
+                fetch(port, path), deadline - start + 5
+            )
+        except (asyncio.TimeoutError, OSError, IndexError, ValueError):
+            status = None
+        if status is None or status >= 400:
+            errors.append(status)
+        else:
+            timings.append((loop.time() - start) * 1000)
+
+
+async def slow_client(port, stop):
+    '''Клиент, который присылает заголовки по байту: медленная сеть без
+    буферизующего прокси'''
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    try:
+        for byte in b'GET /api/tags/ HTTP/1.1\r\nHost: localhost\r\nX-Slow: ':
+            writer.write(bytes((byte,)))
+            await writer.drain()
+            if await wait_stopped(stop, 0.5):
+                return
+        while not await wait_stopped(stop, 0.5):
+            writer.write(b'x')
+            await writer.drain()
+    except OSError:
+        return
+    finally:
+        writer.close()
+
+
+async def wait_stopped(stop, timeout):
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+async def run_load(port, paths, concurrency, duration, slow_clients):
+    loop = asyncio.get_event_loop()
+    stop = asyncio.Event()
+    slow = [
+        loop.create_task(slow_client(port, stop))
+        for _ in range(slow_clients)
+    ]
+    # Медленные клиенты успевают занять соединения до замера
+    await asyncio.sleep(1 if slow_clients else 0)
+    timings, errors = [], []
+    deadline = loop.time() + duration
+    await asyncio.gather(*(
+        load_client(port, paths, deadline, timings, errors)
+        for _ in range(concurrency)
+    ))
+    stop.set()
+    await asyncio.gather(*slow)
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'rps': round(len(timings) / duration, 1),
+        'p50_ms': round(statistics.median(timings), 3) if timings else None,
+        'p95_ms': round(percentile(timings, 0.95), 3) if timings else None,
+    }
+
+
+def measure_serving(mode, port, workers, threads, concurrency_levels,
+                    duration, slow_clients):
+    '''Пропускная способность частых чтений одного режима gunicorn'''
+    paths = hot_paths()
+    process = start_server(mode, port, workers, threads)
+    try:
+        # Прогрев: кеши и соединения с БД воркеров
+        asyncio.run(run_load(port, paths, workers, 1, 0))
+        return {
+            str(concurrency): asyncio.run(run_load(
+                port, paths, concurrency, duration, slow_clients
+            ))
+            for concurrency in concurrency_levels
+        }
+    finally:
+        stop_server(process)
@@ -0,0 +1,451 @@
+import base64
+import contextlib
+import os
+import random
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import ALL, CATALOG, INGREDIENTS, TAGS, bump_versions
+from api.instrumentation import percentile
+from api.mixins import catalog_cache
+from recipes.cookable import cookable_index
+from recipes.counters import recount
+from recipes.management.commands.load_ingredients import (
+    clean_record,
+    iter_csv,
+)
+from recipes.models import (
+    Favorite,
+    Ingredients,
+    Recipe,
+    RecipeIngredients,
+    RecipeTag,
+    ShoppingCart,
+    Tag,
+    User,
+)
+from recipes.popularity import recount_popularity
+from recipes.search import ingredients_index, update_search_vectors
+from users.models import Follow
+
+USERNAME_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+INGREDIENTS_CSV_PATHS = (
+    os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+    os.path.join(settings.BASE_DIR, '..', '..', 'data', 'ingredients.csv'),
+)
+BENCH_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+# Версии, от которых зависят все кеши ответов: списки рецептов и
+# справочники
+CACHE_NAMESPACES = (ALL, CATALOG, TAGS, INGREDIENTS)
+
+
+@contextlib.contextmanager
+def throwaway_database():
+    '''Замеры в отдельной БД test_<имя>, как у тестов Django
+
+    Транзакции в ней фиксируются, поэтому обработчики on_commit (версии
+    кеша, индексы в памяти, поисковые векторы) выполняются так же, как в
+    работе, а после замеров БД удаляется целиком. Ответы, закешированные
+    за это время, становятся недоступны: версии кеша сдвигаются.
+    '''
+    creation = connection.creation
+    old_name = creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        creation.destroy_test_db(old_name, verbosity=0)
+        bump_versions(CACHE_NAMESPACES)
+
+
+class DatasetFactory:
+    '''Быстрое наполнение БД для замеров: bulk_create без сигналов
+
+    Данные добавляются до нужного масштаба: на каждые 10 рецептов один
+    пользователь, у каждого пользователя избранное, список покупок и
+    подписки. Производные данные (счётчики, рейтинги, поисковые векторы,
+    индексы в памяти) пересчитываются в конце.
+    '''
+
+    def __init__(self, seed=0, ingredients_path=None):
+        self.random = random.Random(seed)
+        self.ingredients_path = ingredients_path
+        # SQLite ограничивает число параметров запроса, размер пачки для
+        # него Django подбирает сам
+        self.batch_size = None if connection.vendor == 'sqlite' else 1000
+
+    def ingredient_records(self):
+        paths = (self.ingredients_path,) if self.ingredients_path else (
+            INGREDIENTS_CSV_PATHS
+        )
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, encoding='utf-8', newline='') as file:
+                    for record in iter_csv(file):
+                        name, unit = clean_record(*record)
+                        if name is not None:
+                            yield name, unit
+                return
+        for number in range(2000):
+            yield f'ингредиент {number}', 'г'
+
+    def ensure_catalog(self):
+        if not Ingredients.objects.exists():
+            Ingredients.objects.bulk_create(
+                (
+                    Ingredients(name=name, measurement_unit=unit)
+                    for name, unit in dict(self.ingredient_records()).items()
+                ),
+                batch_size=self.batch_size, ignore_conflicts=True
+            )
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in BENCH_TAGS
+            )
+        self.ingredient_ids = list(
+            Ingredients.objects.values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    def add_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=f'{USERNAME_PREFIX}{number}@example.com',
+                    first_name='Bench', last_name=str(number),
+                    password='!'
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=self.batch_size
+        )
+
+    def bench_users(self):
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).values_list('id', flat=True))
+
+    def add_recipes(self, count, author_ids):
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.random.choice(author_ids),
+                    name=f'Рецепт {number}',
+                    text='Описание рецепта для замеров. ' * 5,
+                    cooking_time=self.random.randint(5, 180),
+                    image='recipe/images/bench.png'
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        # bulk_create возвращает id только в PostgreSQL
+        recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:count])
+        RecipeIngredients.objects.bulk_create(
+            (
+                RecipeIngredients(
+                    recipe_id=recipe_id, ingredients_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    self.ingredient_ids,
+                    min(self.random.randint(3, 10), len(self.ingredient_ids))
+                )
+            ),
+            batch_size=self.batch_size
+        )
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    self.tag_ids, self.random.randint(1, len(self.tag_ids))
+                )
+            ),
+            batch_size=self.batch_size
+        )
+
+    def add_activity(self, user_ids, recipe_ids):
+        '''Избранное, список покупок и подписки новых пользователей'''
+        favorites, carts, follows = [], [], []
+        for user_id in user_ids:
+            for recipe_id in self.random.sample(
+                recipe_ids, min(10, len(recipe_ids))
+            ):
+                favorites.append(
+                    Favorite(user_id=user_id, recipe_id=recipe_id)
+                )
+            for recipe_id in self.random.sample(
+                recipe_ids, min(3, len(recipe_ids))
+            ):
+                carts.append(
+                    ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                )
+            for author_id in self.random.sample(
+                self.all_user_ids, min(5, len(self.all_user_ids))
+            ):
+                if author_id != user_id:
+                    follows.append(
+                        Follow(user_id=user_id, author_id=author_id)
+                    )
+        for model, objects in (
+            (Favorite, favorites), (ShoppingCart, carts), (Follow, follows)
+        ):
+            model.objects.bulk_create(
+                objects, batch_size=self.batch_size, ignore_conflicts=True
+            )
+
+    def refresh_derived(self):
+        for model, field, related_model, related_field in (
+            (Recipe, 'favorites_count', Favorite, 'recipe'),
+            (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+            (User, 'recipes_count', Recipe, 'author'),
+            (User, 'followers_count', Follow, 'author'),
+        ):
+            recount(model.objects.all(), field, related_model, related_field)
+        recount_popularity(Recipe, Favorite, ShoppingCart)
+        update_search_vectors(Recipe.objects.filter(search_vector=None))
+        ingredients_index.invalidate()
+        cookable_index.invalidate()
+        bump_versions(CACHE_NAMESPACES)
+
+    def grow_to(self, recipes):
+        '''Дополняет данные до recipes рецептов'''
+        self.ensure_catalog()
+        missing = recipes - Recipe.objects.count()
+        if missing > 0:
+            users_before = set(self.bench_users())
+            self.add_users(max(1, missing // 10))
+            self.all_user_ids = self.bench_users()
+            new_users = [
+                user_id for user_id in self.all_user_ids
+                if user_id not in users_before
+            ]
+            self.add_recipes(missing, self.all_user_ids)
+            recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+            self.add_activity(new_users, recipe_ids)
+        self.refresh_derived()
+
+
+def sample_image():
+    '''Изображение рецепта для запросов на запись: PNG в data URL'''
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), 'orange').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def recipe_address(created):
+    return f'/api/recipes/{created["id"]}/'
+
+
+def route(name, method, path, data=None, setup=None, undo=None,
+          anonymous=False):
+    '''Маршрут для замеров
+
+    setup и undo — запросы без замера до и после замеряемого, чтобы
+    каждый повтор начинался с одного и того же состояния: кортежи
+    (метод, адрес) или (метод, адрес, данные). Адрес может быть функцией
+    от JSON предыдущего ответа в цепочке setup → запрос → undo, например
+    от только что созданного рецепта. anonymous — запрос без
+    авторизации.
+    '''
+    return {
+        'name': name, 'request': (method, path, data), 'setup': setup,
+        'undo': undo, 'anonymous': anonymous,
+    }
+
+
+def route_table(context):
+    '''Маршруты api/urls.py, см. route'''
+    recipe = context['recipe']
+    favorite = f'/api/recipes/{recipe}/favorite/'
+    cart = f'/api/recipes/{recipe}/shopping_cart/'
+    subscribe = f'/api/users/{context["author"]}/subscribe/'
+    ingredients = ','.join(str(pk) for pk in context['ingredients'])
+    recipe_data = {
+        'tags': [context['tag']],
+        'ingredients': [
+            {'id': pk, 'amount': 100} for pk in context['ingredients']
+        ],
+        'name': 'Рецепт для замеров',
+        'text': 'Описание рецепта для замеров.',
+        'cooking_time': 30,
+    }
+    create = (
+        'post', '/api/recipes/', {**recipe_data, 'image': sample_image()}
+    )
+    remove = ('delete', recipe_address)
+    login = ('post', '/api/auth/token/login/', context['credentials'])
+    logout = ('post', '/api/auth/token/logout/')
+    return (
+        route('tags:list', 'get', '/api/tags/'),
+        route('tags:detail', 'get', f'/api/tags/{context["tag"]}/'),
+        route('ingredients:list', 'get', '/api/ingredients/'),
+        route('ingredients:search', 'get', '/api/ingredients/?name=сах'),
+        route('ingredients:detail', 'get',
+              f'/api/ingredients/{context["ingredients"][0]}/'),
+        route('recipes:list', 'get', '/api/recipes/'),
+        route('recipes:list:anonymous', 'get', '/api/recipes/',
+              anonymous=True),
+        route('recipes:list:cursor', 'get', '/api/recipes/?cursor='),
+        route('recipes:list:filters', 'get',
+              f'/api/recipes/?tags={context["tag_slug"]}&is_favorited=1'
+              f'&cooking_time_max=60'),
+        route('recipes:list:popular', 'get', '/api/recipes/?ordering=popular'),
+        route('recipes:list:search', 'get', '/api/recipes/?search=рецепт'),
+        route('recipes:cookable', 'get',
+              f'/api/recipes/cookable/?ingredients={ingredients}'),
+        route('recipes:detail', 'get', f'/api/recipes/{recipe}/'),
+        route('recipes:create', *create, undo=remove),
+        route('recipes:update', 'patch', recipe_address,
+              {**recipe_data, 'name': 'Новое название'},
+              setup=create, undo=remove),
+        route('recipes:delete', 'delete', recipe_address, setup=create),
+        route('favorite:add', 'post', favorite,
+              undo=('delete', favorite)),
+        route('favorite:remove', 'delete', favorite,
+              setup=('post', favorite)),
+        route('shopping_cart:add', 'post', cart, undo=('delete', cart)),
+        route('shopping_cart:remove', 'delete', cart,
+              setup=('post', cart)),
+        route('shopping_cart:download', 'get',
+              '/api/recipes/download_shopping_cart/'),
+        route('subscriptions:list', 'get',
+              '/api/users/subscriptions/?recipes_limit=3'),
+        route('subscribe:add', 'post', subscribe,
+              undo=('delete', subscribe)),
+        route('subscribe:remove', 'delete', subscribe,
+              setup=('post', subscribe)),
+        route('users:list', 'get', '/api/users/'),
+        route('users:detail', 'get', f'/api/users/{context["author"]}/'),
+        route('users:me', 'get', '/api/users/me/'),
+        route('auth:login', *login, undo=logout),
+        route('auth:logout', *logout, setup=login),
+    )
+
+
+def route_context(user):
+    '''Идентификаторы для адресов: рецепт не из избранного пользователя,
+    автор, на которого он не подписан, и т. п.'''
+    recipe = Recipe.objects.exclude(favorite_users__user=user).exclude(
+        shop_cart_recipe__user=user
+    ).values_list('id', flat=True).first()
+    author = User.objects.exclude(id=user.id).exclude(
+        following__user=user
+    ).values_list('id', flat=True).first()
+    tag = Tag.objects.first()
+    if recipe is None or author is None:
+        raise RuntimeError(
+            'Для замеров нужны рецепт вне избранного и списка покупок '
+            'пользователя и автор, на которого он не подписан: увеличьте '
+            'объём данных'
+        )
+    return {
+        'recipe': recipe,
+        'author': author,
+        'tag': tag.id,
+        'tag_slug': tag.slug,
+        'ingredients': list(RecipeIngredients.objects.filter(
+            recipe_id=recipe
+        ).values_list('ingredients_id', flat=True)[:3]),
+    }
+
+
+def response_size(response):
+    if response.streaming:
+        return len(b''.join(response.streaming_content))
+    return len(response.content)
+
+
+def reset_caches():
+    '''Первый запрос маршрута идёт без прогретых кешей
+
+    Общий кеш не очищается: в нём могут быть данные других частей
+    приложения, сдвиг версий делает недоступными только ответы API.
+    '''
+    bump_versions(CACHE_NAMESPACES)
+    catalog_cache.clear()
+    ingredients_index.invalidate()
+    cookable_index.invalidate()
+
+
+def send(client, step, previous):
+    '''Запрос (метод, адрес[, данные]); previous — предыдущий ответ'''
+    method, path, *data = step
+    if callable(path):
+        path = path(previous.json())
+    if data and data[0] is not None:
+        return getattr(client, method)(path, data[0], format='json')
+    return getattr(client, method)(path)
+
+
+def measure_route(client, route, repeat):
+    reset_caches()
+    timings = []
+    queries = size = status = None
+    for number in range(repeat):
+        previous = None
+        if route['setup'] is not None:
+            previous = send(client, route['setup'], None)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = send(client, route['request'], previous)
+            size_bytes = response_size(response)
+            timings.append((time.perf_counter() - start) * 1000)
+        if number == 0:
+            queries = len(captured.captured_queries)
+            size, status = size_bytes, response.status_code
+        if route['undo'] is not None:
+            send(client, route['undo'], response)
+    timings.sort()
+    return {
+        'status': status,
+        'queries': queries,
+        'bytes': size,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+    }
+
+
+def measure_routes(user, repeat, only=None):
+    '''Замеры от имени user; для входа по токену ему задаётся пароль'''
+    user.set_password(BENCH_PASSWORD)
+    user.save(update_fields=('password',))
+    client = APIClient()
+    client.force_authenticate(user)
+    anonymous = APIClient()
+    context = route_context(user)
+    context['credentials'] = {
+        'email': user.email, 'password': BENCH_PASSWORD
+    }
+    results = {}
+    for route in route_table(context):
+        name = route['name']
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = measure_route(
+            anonymous if route['anonymous'] else client, route, repeat
+        )
+    return results
@@ -0,0 +1,78 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_PREFIX = 'recipes:version:'
+LIST_PREFIX = 'recipes:list:'
+
+# Пространства версий: все рецепты, рецепты тега, рецепты автора и
+# справочники (теги, ингредиенты), которые выводятся в каждом рецепте.
+# POPULARITY — счётчики избранного и корзин: от них зависит только
+# порядок popular и trending
+ALL = 'all'
+CATALOG = 'catalog'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+POPULARITY = 'popularity'
+POPULARITY_ORDERINGS = ('popular', 'trending')
+
+
+def tag_namespace(slug):
+    return f'tag:{slug}'
+
+
+def author_namespace(author_id):
+    return f'author:{author_id}'
+
+
+def new_version():
+    # Версия — время изменения в наносекундах, а не счётчик с нуля:
+    # вытесненная из кеша версия не вернёт к жизни старые записи,
+    # а по версии справочника можно отдавать Last-Modified
+    return time.time_ns()
+
+
+def get_versions(namespaces):
+    keys = [VERSION_PREFIX + namespace for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=settings.CACHE_VERSIONS_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(namespaces):
+    version = new_version()
+    cache.set_many(
+        {VERSION_PREFIX + namespace: version for namespace in namespaces},
+        timeout=settings.CACHE_VERSIONS_TIMEOUT
+    )
+
+
+def recipe_list_key(request, params):
+    '''Ключ страницы списка рецептов для анонимного пользователя
+
+    Учитываются только параметры из params (значения сортируются),
+    и версии тех пространств, от которых зависит выборка.
+    '''
+    query = request.query_params
+    normalized = tuple(
+        (param, tuple(sorted(set(query.getlist(param)))))
+        for param in params if param in query
+    )
+    namespaces = [CATALOG]
+    tags = query.getlist('tags')
+    if tags:
+        namespaces += [tag_namespace(slug) for slug in sorted(set(tags))]
+    if query.get('author'):
+        namespaces.append(author_namespace(query['author']))
+    if len(namespaces) == 1:
+        namespaces.append(ALL)
+    if query.get('ordering') in POPULARITY_ORDERINGS:
+        namespaces.append(POPULARITY)
+    versions = get_versions(namespaces)
+    raw = repr((request.build_absolute_uri('/'), normalized, versions))
+    return LIST_PREFIX + hashlib.md5(raw.encode()).hexdigest()
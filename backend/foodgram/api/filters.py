@@ -0,0 +1,89 @@
+from django.db.models import Count
+from django_filters import rest_framework as filters
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredients,
+    RecipeTag,
+    ShoppingCart,
+)
+from recipes.search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class RecipeFilter(filters.FilterSet):
+    '''Фильтры ленты рецептов, которые можно сочетать друг с другом
+
+    Избранное, список покупок, теги и ингредиенты фильтруются
+    подзапросами id IN (...), без JOIN и DISTINCT; флаги, которые
+    аннотирует RecipeViewSet, нужны только строкам страницы.
+    '''
+    is_favorited = filters.BooleanFilter(method='filter_user_flag')
+    is_in_shopping_cart = filters.BooleanFilter(method='filter_user_flag')
+    author = filters.NumberFilter(field_name='author')
+    tags = filters.CharFilter(method='filter_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_nothing'
+    )
+    cooking_time = filters.RangeFilter()
+    ingredients = NumberInFilter(method='filter_ingredients')
+    search = filters.CharFilter(method='filter_search')
+    user_flag_models = {
+        'is_favorited': Favorite,
+        'is_in_shopping_cart': ShoppingCart,
+    }
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+            'tags_mode', 'cooking_time', 'ingredients', 'search'
+        )
+
+    def filter_user_flag(self, queryset, name, value):
+        '''Для анонимного пользователя фильтр не применяется'''
+        if value is None or not self.request.user.is_authenticated:
+            return queryset
+        recipe_ids = self.user_flag_models[name].objects.filter(
+            user=self.request.user
+        ).values('recipe_id')
+        if value:
+            return queryset.filter(id__in=recipe_ids)
+        return queryset.exclude(id__in=recipe_ids)
+
+    def filter_nothing(self, queryset, name, value):
+        # tags_mode учитывается в filter_tags
+        return queryset
+
+    def filter_tags(self, queryset, name, value):
+        '''Рецепты с любым из тегов или, при tags_mode=all, со всеми'''
+        slugs = set(self.data.getlist(name))
+        recipe_tags = RecipeTag.objects.filter(tag__slug__in=slugs)
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            recipe_tags = recipe_tags.values('recipe_id').annotate(
+                tags_count=Count('tag_id')
+            ).filter(tags_count=len(slugs))
+        return queryset.filter(id__in=recipe_tags.values('recipe_id'))
+
+    def filter_ingredients(self, queryset, name, value):
+        '''Рецепты, в которых есть все перечисленные ингредиенты'''
+        ingredient_ids = set(value)
+        return queryset.filter(
+            id__in=RecipeIngredients.objects.filter(
+                ingredients_id__in=ingredient_ids
+            ).values('recipe_id').annotate(
+                ingredients_count=Count('ingredients_id')
+            ).filter(
+                ingredients_count=len(ingredient_ids)
+            ).values('recipe_id')
+        )
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,116 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+
+# Списки значений разной длины — один и тот же шаблон запроса
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def sql_template(sql):
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def percentile(ordered, fraction):
+    '''Перцентиль по ближайшему рангу: наименьшее значение, не меньше
+    которого доля fraction значений'''
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+class QueryRecorder:
+    '''Обёртка connection.execute_wrapper: число, время и шаблоны запросов
+
+    Без track_templates считаются только число и время: так дешевле, когда
+    шаблоны не нужны.
+    '''
+
+    def __init__(self, track_templates=True):
+        self.track_templates = track_templates
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+            if self.track_templates:
+                self.templates[sql_template(sql)] += 1
+
+    def repeated(self, threshold):
+        '''Шаблоны, выполненные больше threshold раз: признак N+1'''
+        return {
+            template: count for template, count in self.templates.items()
+            if count > threshold
+        }
+
+
+class RouteStats:
+    '''Скользящая статистика маршрутов в памяти процесса
+
+    Для каждого маршрута хранятся последние INSTRUMENTATION_WINDOW
+    замеров; перцентили считаются при запросе статистики.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = defaultdict(self._window)
+        self._queries = defaultdict(self._window)
+        self._totals = Counter()
+        self._n_plus_one = Counter()
+
+    @staticmethod
+    def _window():
+        return deque(maxlen=settings.INSTRUMENTATION_WINDOW)
+
+    def add(self, route, duration, queries, n_plus_one):
+        with self._lock:
+            self._durations[route].append(duration)
+            self._queries[route].append(queries)
+            self._totals[route] += 1
+            if n_plus_one:
+                self._n_plus_one[route] += 1
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+            self._queries.clear()
+            self._totals.clear()
+            self._n_plus_one.clear()
+
+    def snapshot(self):
+        with self._lock:
+            windows = {
+                route: (sorted(durations), list(self._queries[route]))
+                for route, durations in self._durations.items()
+            }
+            totals = dict(self._totals)
+            n_plus_one = dict(self._n_plus_one)
+        return {
+            route: {
+                'requests': totals[route],
+                'window': len(durations),
+                'p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+                'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+                'avg_queries': round(sum(queries) / len(queries), 2),
+                'max_queries': max(queries),
+                'n_plus_one': n_plus_one.get(route, 0),
+            }
+            for route, (durations, queries) in sorted(windows.items())
+        }
+
+
+route_stats = RouteStats()
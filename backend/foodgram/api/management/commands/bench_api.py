@@ -0,0 +1,115 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import (
+    USERNAME_PREFIX,
+    DatasetFactory,
+    measure_routes,
+    throwaway_database,
+)
+from recipes.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число запросов к БД, время и размер ответа каждого '
+        'маршрута API на нескольких объёмах данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='100,1000,10000',
+            help='Число рецептов на каждом шаге, через запятую'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--ingredients', help='Путь к ingredients.csv')
+        parser.add_argument(
+            '--routes', nargs='*',
+            help='Только маршруты с этими префиксами, например recipes:'
+        )
+        parser.add_argument('--output', help='Куда записать результаты JSON')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого запуска: ошибка, если запросов стало больше'
+        )
+        parser.add_argument(
+            '--max-query-growth', type=int, default=0,
+            help='Сколько запросов сверх baseline допустимо'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Наполнять рабочую БД и оставить в ней данные для замеров, '
+            'а не создавать отдельную временную БД'
+        )
+
+    def check_regressions(self, results, baseline, growth):
+        regressions = []
+        for scale, routes in results.items():
+            for route, measured in routes.items():
+                previous = baseline.get(scale, {}).get(route)
+                if previous is None:
+                    continue
+                if measured['queries'] > previous['queries'] + growth:
+                    regressions.append(
+                        f'{scale} {route}: {previous["queries"]} → '
+                        f'{measured["queries"]} запросов'
+                    )
+        return regressions
+
+    def write_table(self, scale, routes):
+        self.stdout.write(f'\nРецептов: {scale}')
+        for route, measured in routes.items():
+            self.stdout.write(
+                f'{route:<26} {measured["status"]:>3} '
+                f'{measured["queries"]:>4} запр. '
+                f'p50 {measured["p50_ms"]:>9.2f} мс '
+                f'p95 {measured["p95_ms"]:>9.2f} мс '
+                f'{measured["bytes"]:>9} байт'
+            )
+
+    def run(self, options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales: числа через запятую')
+        factory = DatasetFactory(options['seed'], options['ingredients'])
+        results = {}
+        for scale in sorted(scales):
+            factory.grow_to(scale)
+            user = User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).order_by('id').first()
+            try:
+                routes = measure_routes(
+                    user, options['repeat'], options['routes']
+                )
+            except RuntimeError as error:
+                raise CommandError(str(error))
+            results[str(scale)] = routes
+            self.write_table(scale, routes)
+        return results
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        if options['keep']:
+            results = self.run(options)
+        else:
+            with throwaway_database():
+                results = self.run(options)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            regressions = self.check_regressions(
+                results, baseline, options['max_query_growth']
+            )
+            if regressions:
+                raise CommandError(
+                    'Выросло число запросов:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
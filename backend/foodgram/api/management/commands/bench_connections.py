@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.bench_connections import measure_connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время запроса к БД с новым соединением на каждый запрос, '
+        'с постоянным соединением (с проверкой и без) и с пулом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Потоков, как в воркере gthread или ASGI'
+        )
+        parser.add_argument(
+            '--pool-size', type=int, default=4,
+            help='Размер пула в режиме pool'
+        )
+        parser.add_argument('--output', help='Куда записать результаты JSON')
+
+    def handle(self, *args, **options):
+        results = measure_connections(
+            options['repeat'], options['threads'], options['pool_size']
+        )
+        for mode, measured in results.items():
+            self.stdout.write(
+                f'{mode:<18} p50 {measured["p50_ms"]:>8.3f} мс '
+                f'p95 {measured["p95_ms"]:>8.3f} мс '
+                f'экономия {measured["saved_ms"]:>8.3f} мс'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench_serving import measure_serving
+
+MODES = ('sync', 'gthread', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность частых чтений API под gunicorn '
+        'с sync-воркерами, потоками (gthread) и в режиме ASGI'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', default=','.join(MODES),
+            help='Режимы через запятую: sync, gthread, asgi'
+        )
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--threads', type=int, default=8, help='Потоков воркера gthread'
+        )
+        parser.add_argument(
+            '--concurrency', default='1,10,50',
+            help='Одновременных клиентов на каждом шаге, через запятую'
+        )
+        parser.add_argument(
+            '--duration', type=int, default=10, help='Секунд на шаг'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Сколько клиентов присылают заголовки по байту'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help='Куда записать результаты JSON')
+
+    def write_table(self, mode, levels):
+        self.stdout.write(f'\n{mode}')
+        for concurrency, measured in levels.items():
+            self.stdout.write(
+                f'клиентов {concurrency:>4} '
+                f'{measured["rps"]:>9.1f} запр./с '
+                f'p50 {measured["p50_ms"] or 0:>9.2f} мс '
+                f'p95 {measured["p95_ms"] or 0:>9.2f} мс '
+                f'ошибок {measured["errors"]:>5}'
+            )
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Неизвестные режимы: {", ".join(unknown)}')
+        try:
+            levels = [
+                int(level) for level in options['concurrency'].split(',')
+            ]
+        except ValueError:
+            raise CommandError('--concurrency: числа через запятую')
+        results = {}
+        for mode in modes:
+            try:
+                results[mode] = measure_serving(
+                    mode, options['port'], options['workers'],
+                    options['threads'], levels, options['duration'],
+                    options['slow_clients']
+                )
+            except RuntimeError as error:
+                raise CommandError(str(error))
+            self.write_table(mode, results[mode])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
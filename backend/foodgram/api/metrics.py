@@ -0,0 +1,262 @@
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# Границы корзин гистограммы времени ответа, в секундах
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf
+)
+# Семейства метрик: имя → (тип, описание)
+FAMILIES = {
+    'foodgram_http_requests_total': (
+        'counter', 'Запросы к API по представлениям DRF'
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время ответа по представлениям DRF'
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'Запросы к БД по представлениям DRF'
+    ),
+    'foodgram_db_query_duration_seconds_total': (
+        'counter', 'Время запросов к БД по представлениям DRF'
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешам ответов: hit, miss, not_modified'
+    ),
+    'foodgram_image_uploads_total': (
+        'counter', 'Принятые изображения рецептов'
+    ),
+    'foodgram_image_upload_bytes_total': (
+        'counter', 'Байты принятых изображений рецептов'
+    ),
+}
+FILE_SUFFIX = '.metrics'
+INITIAL_FILE_SIZE = 64 * 1024
+# Заголовок файла: занятые байты (uint32) и выравнивание до 8
+HEADER = struct.Struct('<I4x')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def metric_key(name, labels):
+    '''Имя и метки в виде строки: ключ значения в файле'''
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def entry_padding(key_length):
+    '''Значение float64 в записи выравнивается по 8 байтам'''
+    return -(KEY_LENGTH.size + key_length) % 8
+
+
+def read_entries(data):
+    '''(ключ, значение, смещение значения) записей файла метрик'''
+    used, = HEADER.unpack_from(data, 0)
+    position = HEADER.size
+    while position < used:
+        length, = KEY_LENGTH.unpack_from(data, position)
+        position += KEY_LENGTH.size
+        key = bytes(data[position:position + length]).decode()
+        position += length + entry_padding(length)
+        value, = VALUE.unpack_from(data, position)
+        yield key, value, position
+        position += VALUE.size
+
+
+class MetricsFile:
+    '''Значения метрик одного процесса в файле, отображённом в память
+
+    Файл пишет только процесс, которому он принадлежит; новая запись
+    сначала дописывается целиком, потом в заголовке сдвигается граница
+    занятых байт, поэтому читающий процесс всегда видит целые записи.
+    Смещения значений запоминаются, и увеличение счётчика — одна запись
+    восьми байт без системных вызовов.
+    '''
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        if self._capacity == 0:
+            self._capacity = INITIAL_FILE_SIZE
+            self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        if HEADER.unpack_from(self._map, 0)[0] == 0:
+            HEADER.pack_into(self._map, 0, HEADER.size)
+        self._used, = HEADER.unpack_from(self._map, 0)
+        # Файл умершего процесса с тем же pid: счётчики продолжаются
+        self._positions = {
+            key: position for key, _, position in read_entries(self._map)
+        }
+
+    def _grow(self, size):
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+        self._map.close()
+        self._file.truncate(capacity)
+        self._capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padding = entry_padding(len(encoded))
+        entry = (
+            KEY_LENGTH.pack(len(encoded)) + encoded + b'\0' * padding
+            + VALUE.pack(0.0)
+        )
+        end = self._used + len(entry)
+        if end > self._capacity:
+            self._grow(end)
+        self._map[self._used:end] = entry
+        position = end - VALUE.size
+        self._used = end
+        HEADER.pack_into(self._map, 0, end)
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value, = VALUE.unpack_from(self._map, position)
+            VALUE.pack_into(self._map, position, value + amount)
+
+
+def metrics_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{pid}{FILE_SUFFIX}')
+
+
+def get_values():
+    '''Файл текущего процесса; после fork у воркера gunicorn — свой'''
+    global _values
+    pid = os.getpid()
+    with _values_lock:
+        if _values is None or _values[0] != pid:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _values = (pid, MetricsFile(metrics_path(pid)))
+        return _values[1]
+
+
+def inc(name, labels, amount=1):
+    if settings.METRICS_ENABLED:
+        get_values().inc(metric_key(name, labels), amount)
+
+
+def observe(name, labels, value, buckets=DURATION_BUCKETS):
+    '''Замер гистограммы: корзины хранятся без накопления, сумма
+    по корзинам считается при выдаче'''
+    if not settings.METRICS_ENABLED:
+        return
+    values = get_values()
+    bucket = next(bound for bound in buckets if value <= bound)
+    values.inc(
+        metric_key(f'{name}_bucket', dict(labels, le=bucket)), 1
+    )
+    values.inc(metric_key(f'{name}_sum', labels), value)
+    values.inc(metric_key(f'{name}_count', labels), 1)
+
+
+def collect():
+    '''Сумма значений по файлам всех процессов, в том числе завершённых:
+    счётчики воркеров, перезапущенных gunicorn, не теряются'''
+    totals = defaultdict(float)
+    for path in glob.glob(os.path.join(
+        settings.METRICS_DIR, f'*{FILE_SUFFIX}'
+    )):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            continue
+        for key, value, _ in read_entries(data):
+            totals[key] += value
+    return totals
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace(
+        '"', r'\"'
+    )
+
+
+def format_sample(name, labels, value):
+    if not labels:
+        return f'{name} {format_value(value)}'
+    rendered = ','.join(
+        f'{label}="{escape_label(label_value)}"'
+        for label, label_value in labels
+    )
+    return f'{name}{{{rendered}}} {format_value(value)}'
+
+
+def histogram_samples(name, samples, buckets=DURATION_BUCKETS):
+    '''Корзины с накоплением, включая пустые, затем _sum и _count'''
+    counts = defaultdict(dict)
+    rest = []
+    for sample_name, labels, value in samples:
+        if sample_name == f'{name}_bucket':
+            labels = dict(labels)
+            bound = labels.pop('le')
+            counts[tuple(sorted(labels.items()))][bound] = value
+        else:
+            rest.append((sample_name, labels, value))
+    lines = []
+    for labels, bucket_counts in sorted(counts.items()):
+        total = 0
+        for bound in buckets:
+            total += bucket_counts.get(bound, 0)
+            lines.append(format_sample(
+                f'{name}_bucket', labels + (('le', format_value(bound)),),
+                total
+            ))
+    lines.extend(
+        format_sample(sample_name, labels, value)
+        for sample_name, labels, value in sorted(rest)
+    )
+    return lines
+
+
+def render():
+    '''Текстовый формат Prometheus (exposition format 0.0.4)'''
+    families = defaultdict(list)
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        labels = tuple(tuple(pair) for pair in labels)
+        family = next(
+            (
+                family for family in FAMILIES
+                if name == family or name.startswith(f'{family}_')
+            ),
+            name
+        )
+        families[family].append((name, labels, value))
+    lines = []
+    for family, (kind, description) in FAMILIES.items():
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        if kind == 'histogram':
+            lines.extend(histogram_samples(family, families[family]))
+        else:
+            lines.extend(
+                format_sample(name, labels, value)
+                for name, labels, value in sorted(families[family])
+            )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,143 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api import metrics
+from api.instrumentation import QueryRecorder, route_stats
+
+logger = logging.getLogger('foodgram.requests')
+
+
+def route_name(request):
+    '''GET recipes-list, а не адрес с id: статистика по маршрутам'''
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match is not None else 'unresolved'
+    return f'{request.method} {view_name}'
+
+
+class InstrumentationMiddleware:
+    '''Запросы к БД, время и размер ответа для каждого запроса
+
+    Включается настройкой INSTRUMENTATION_ENABLED. Время делится на БД,
+    рендеринг ответа и остальное (представление и сериализаторы) и
+    отдаётся в заголовке Server-Timing; строка с замером пишется в лог
+    foodgram.requests, а маршрут попадает в route_stats. Шаблон запроса,
+    повторённый больше INSTRUMENTATION_N_PLUS_ONE раз, отмечается как N+1.
+    Запросы, которые потоковый ответ делает при отдаче тела, не учитываются.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def process_template_response(self, request, response):
+        '''Ответы DRF рендерятся после middleware: время — через callback'''
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.render_duration = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.render_duration = 0.0
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        route = route_name(request)
+        repeated = recorder.repeated(settings.INSTRUMENTATION_N_PLUS_ONE)
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = self.server_timing(
+            recorder, request.render_duration, duration
+        )
+        route_stats.add(route, duration, recorder.count, bool(repeated))
+        self.log(request, response, route, recorder, duration, size,
+                 repeated)
+        return response
+
+    @staticmethod
+    def server_timing(recorder, render, total):
+        app = max(0.0, total - recorder.duration - render)
+        return ', '.join((
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries"',
+            f'app;dur={app * 1000:.2f};desc="view and serializers"',
+            f'render;dur={render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+
+    @staticmethod
+    def log(request, response, route, recorder, duration, size, repeated):
+        slowest_duration, slowest_sql = recorder.slowest
+        record = {
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 3),
+            'slowest_sql_ms': round(slowest_duration * 1000, 3),
+            'slowest_sql': slowest_sql,
+            'bytes': size,
+        }
+        if repeated:
+            record['n_plus_one'] = repeated
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def view_label(request):
+    '''Класс представления DRF или имя функции: RecipeViewSet,
+    shopping_cart_txt'''
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'cls', match.func)
+    return view.__name__
+
+
+class MetricsMiddleware:
+    '''Счётчики запросов, гистограмма времени и запросы к БД для /metrics
+
+    Включается настройкой METRICS_ENABLED. Значения пишутся в файл
+    процесса в METRICS_DIR (см. api/metrics.py), поэтому /metrics любого
+    воркера gunicorn отдаёт сумму по всем воркерам.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(track_templates=False)
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        view = view_label(request)
+        metrics.inc('foodgram_http_requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': str(response.status_code),
+        })
+        labels = {'view': view, 'method': request.method}
+        metrics.observe(
+            'foodgram_http_request_duration_seconds', labels, duration
+        )
+        if recorder.count:
+            metrics.inc('foodgram_db_queries_total', labels, recorder.count)
+            metrics.inc(
+                'foodgram_db_query_duration_seconds_total', labels,
+                recorder.duration
+            )
+        return response
@@ -0,0 +1,57 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from api import metrics
+from api.cache import get_versions
+
+# Полные списки справочников в памяти процесса: {пространство: (версия,
+# данные)}. Версия читается из общего кеша на каждом запросе, поэтому
+# изменение в другом процессе сбрасывает и эту копию
+catalog_cache = {}
+
+
+class CatalogCacheMixin:
+    '''Список справочника с ETag, Last-Modified и условным GET
+
+    ETag строится из версии справочника в кеше и адреса запроса, поэтому
+    на If-None-Match ответ 304 отдаётся без запросов к БД и сериализации.
+    '''
+    catalog_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        version, = get_versions((self.catalog_namespace,))
+        etag = quote_etag(hashlib.md5(
+            f'{self.catalog_namespace}:{version}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest())
+        last_modified = version // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(self.get_catalog_data(version))
+        else:
+            self.count_cache('not_modified')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_catalog_data(self, version):
+        if self.request.query_params:
+            return super().list(self.request).data
+        cached = catalog_cache.get(self.catalog_namespace)
+        if cached is None or cached[0] != version:
+            self.count_cache('miss')
+            cached = (version, super().list(self.request).data)
+            catalog_cache[self.catalog_namespace] = cached
+        else:
+            self.count_cache('hit')
+        return cached[1]
+
+    def count_cache(self, result):
+        metrics.inc('foodgram_cache_requests_total', {
+            'cache': f'catalog:{self.catalog_namespace}', 'result': result
+        })
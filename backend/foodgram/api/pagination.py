@@ -0,0 +1,78 @@
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class FeedPaginator(Paginator):
+    '''COUNT только по id: аннотации выборки (флаги пользователя, rank) и
+    её сортировка в подсчёт не попадают и считаются только для строк
+    страницы'''
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by().values('pk').count()
+
+
+class KeysetPagination(CursorPagination):
+    '''Курсор по убыванию id: выборка через id < курсор, без COUNT
+
+    Представление может задать свой порядок методом get_ordering. Позиция
+    курсора — значение только первого поля порядка, поэтому оно должно
+    быть уникальным (см. supports_ordering).
+    '''
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    unique_fields = ('id', 'pk')
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return super().get_ordering(request, queryset, view)
+
+    def supports_ordering(self, ordering):
+        return ordering[0].lstrip('-') in self.unique_fields
+
+
+class FeedPagination(PageNumberPagination):
+    '''Номера страниц по умолчанию, курсор — если передан ?cursor
+
+    Первую страницу в режиме курсора запрашивают с пустым ?cursor=,
+    следующие — по ссылке next из ответа. Порядки с неуникальным первым
+    полем (popular, trending, релевантность поиска) всегда отдаются по
+    номерам страниц: значения popularity и rank совпадают у многих
+    рецептов и меняются между запросами, и курсор по ним пропускал бы
+    или повторял рецепты.
+    '''
+    django_paginator_class = FeedPaginator
+    keyset_pagination_class = KeysetPagination
+    page_size_query_param = KeysetPagination.page_size_query_param
+    max_page_size = KeysetPagination.max_page_size
+
+    def get_keyset(self, request, queryset, view):
+        if (
+            self.keyset_pagination_class.cursor_query_param
+            not in request.query_params
+        ):
+            return None
+        keyset = self.keyset_pagination_class()
+        ordering = keyset.get_ordering(request, queryset, view)
+        if not keyset.supports_ordering(ordering):
+            return None
+        return keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.get_keyset(request, queryset, view)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
@@ -1,12 +1,23 @@
 import base64
+import binascii
+import re
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
+from PIL import Image
 from rest_framework import serializers
 
+from api import metrics
+from recipes.images import rendition_url
 from recipes.models import Ingredients, Recipe, RecipeIngredients, Tag, User
 
+DATA_URL_RE = re.compile(r'data:image/(?P<extension>[a-z0-9]+);base64,')
+DATA_URL_HEADER_MAX_LENGTH = 32
+
 
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -18,6 +29,8 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         req = self.context.get('request')
         user = req.user
         if user.is_authenticated:
@@ -39,21 +52,32 @@ class IngredientsSerializer(serializers.ModelSerializer):
         model = Ingredients
 
 
+class RecipeImageField(serializers.ReadOnlyField):
+    '''Ссылка на копию изображения нужного размера
+
+    Размер задаётся аргументом или ключом image_size контекста, по
+    умолчанию — копия для страницы рецепта.
+    '''
+
+    def __init__(self, size=None, **kwargs):
+        self.size = size
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        size = self.size or self.context.get('image_size', 'detail')
+        url = rendition_url(recipe, size)
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
 class RecipeIngredViewSerializer(serializers.ModelSerializer):
-    id = serializers.SlugRelatedField(
-        read_only=True,
-        slug_field='id',
-        source='ingredients'
-    )
-    name = serializers.SlugRelatedField(
-        read_only=True,
-        slug_field='name',
-        source='ingredients'
-    )
-    measurement_unit = serializers.SlugRelatedField(
-        read_only=True,
-        slug_field='measurement_unit',
-        source='ingredients'
+    id = serializers.ReadOnlyField(source='ingredients_id')
+    name = serializers.ReadOnlyField(source='ingredients.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredients.measurement_unit'
     )
 
     class Meta:
@@ -67,6 +91,7 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         many=True, read_only=True, source='recipes_ingr'
     )
     tags = TagSerializer(many=True, read_only=True)
+    image = RecipeImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -78,6 +103,8 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         model = Recipe
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         req = self.context.get('request')
         user = req.user
         if user.is_authenticated:
@@ -85,6 +112,8 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         req = self.context.get('request')
         user = req.user
         if user.is_authenticated:
@@ -92,11 +121,16 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         return False
 
 
+class CookableRecipeSerializer(RecipeViewSerializer):
+    '''Рецепт из подбора по продуктам с числом недостающих ингредиентов'''
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeViewSerializer.Meta):
+        fields = RecipeViewSerializer.Meta.fields + ('missing_count',)
+
+
 class RecipeIngredSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredients.objects.all(),
-        source='ingredients'
-    )
+    id = serializers.IntegerField(source='ingredients')
 
     class Meta:
         fields = ('id', 'amount')
@@ -104,22 +138,101 @@ class RecipeIngredSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    '''Изображение в виде data:image/<формат>;base64,<данные>
+
+    Размер проверяется по длине строки до декодирования; строка
+    декодируется частями во временный файл, который при превышении
+    RECIPE_IMAGE_SPOOL_SIZE переносится из памяти на диск. Размеры в
+    пикселях Pillow проверяет по заголовку, до разбора всего файла.
+    '''
+    default_error_messages = {
+        'invalid_base64': 'Некорректное изображение в base64.',
+        'too_large': 'Изображение больше {max_size} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+    # Кратно 4, чтобы каждая часть декодировалась отдельно
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
+        if isinstance(data, str):
+            # base64 бывает разбит на строки по 76 символов (MIME)
+            compact = ''.join(data.split())
+            if compact.startswith('data:image'):
+                data = compact
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+            file = self.decode(data)
+            try:
+                # Файл уже проверен Pillow в decode: проверка ImageField
+                # скопировала бы его в память целиком
+                file = serializers.FileField.to_internal_value(self, file)
+            except Exception:
+                file.close()
+                raise
+        else:
+            file = super().to_internal_value(data)
+        metrics.inc('foodgram_image_uploads_total', {})
+        metrics.inc('foodgram_image_upload_bytes_total', {}, file.size)
+        return file
+
+    def decoded_size(self, data, start):
+        encoded_length = len(data) - start
+        if encoded_length == 0 or encoded_length % 4:
+            self.fail('invalid_base64')
+        padding = 2 if data.endswith('==') else int(data.endswith('='))
+        size = encoded_length // 4 * 3 - padding
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        return size
+
+    def check_image(self, file):
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+                if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                    self.fail(
+                        'too_many_pixels',
+                        max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+                    )
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        file.seek(0)
+
+    def write_decoded(self, file, data, start):
+        try:
+            for position in range(start, len(data), self.chunk_size):
+                file.write(base64.b64decode(
+                    data[position:position + self.chunk_size], validate=True
+                ))
+        except binascii.Error:
+            self.fail('invalid_base64')
+        file.seek(0)
+
+    def decode(self, data):
+        '''Файл из data URL без пробельных символов; при ошибке файл
+        закрывается'''
+        header = DATA_URL_RE.match(data, 0, DATA_URL_HEADER_MAX_LENGTH)
+        if header is None:
+            self.fail('invalid_base64')
+        size = self.decoded_size(data, header.end())
+        file = SpooledTemporaryFile(max_size=settings.RECIPE_IMAGE_SPOOL_SIZE)
+        try:
+            self.write_decoded(file, data, header.end())
+            self.check_image(file)
+        except Exception:
+            file.close()
+            raise
+        return UploadedFile(
+            file, name=f'temp.{header["extension"]}',
+            content_type=f'image/{header["extension"]}', size=size
+        )
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(read_only=True)
     image = Base64ImageField()
     ingredients = RecipeIngredSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
 
     class Meta:
         fields = (
@@ -128,39 +241,111 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         model = Recipe
 
+    @staticmethod
+    def does_not_exist(pk_value):
+        return serializers.ValidationError(
+            serializers.PrimaryKeyRelatedField.default_error_messages[
+                'does_not_exist'
+            ].format(pk_value=pk_value)
+        )
+
+    def validate_tags(self, value):
+        '''Все теги рецепта загружаются одним запросом'''
+        tags = Tag.objects.in_bulk(value)
+        for tag_id in value:
+            if tag_id not in tags:
+                raise self.does_not_exist(tag_id)
+        return [tags[tag_id] for tag_id in value]
+
+    def validate_ingredients(self, value):
+        '''Все ингредиенты рецепта загружаются одним запросом'''
+        ingredient_ids = [ingr['ingredients'] for ingr in value]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты рецепта не должны повторяться.'
+            )
+        ingredients = Ingredients.objects.in_bulk(ingredient_ids)
+        for ingr in value:
+            if ingr['ingredients'] not in ingredients:
+                raise self.does_not_exist(ingr['ingredients'])
+            ingr['ingredients'] = ingredients[ingr['ingredients']]
+        return value
+
+    @staticmethod
+    def set_ingredients(recipe, ingredients, created=False):
+        '''Добавляет, обновляет и удаляет только изменившиеся строки'''
+        amounts = {
+            ingr['ingredients'].id: ingr['amount'] for ingr in ingredients
+        }
+        current = {} if created else {
+            ingr.ingredients_id: ingr for ingr in recipe.recipes_ingr.all()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredients__in=removed
+            ).delete()
+        changed = []
+        for ingr_id in current.keys() & amounts.keys():
+            if current[ingr_id].amount != amounts[ingr_id]:
+                current[ingr_id].amount = amounts[ingr_id]
+                changed.append(current[ingr_id])
+        if changed:
+            RecipeIngredients.objects.bulk_update(changed, ('amount',))
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(
+                recipe=recipe, ingredients_id=ingr_id, amount=amount
+            )
+            for ingr_id, amount in amounts.items()
+            if ingr_id not in current
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient in ingredients:
-            RecipeIngredients.objects.create(
-                recipe=recipe,
-                **ingredient
-            )
+        self.set_ingredients(recipe, ingredients, created=True)
         recipe.tags.set(tags)
-        recipe.save()
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        instance.text = validated_data.get('text', instance.text)
-        instance.name = validated_data.get('name', instance.name)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.tags.set(validated_data.get('tags', instance.tags))
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        for ingr in validated_data.get('ingredients', instance.ingredients):
-            RecipeIngredients.objects.create(
-                recipe=instance,
-                ingredients=ingr.get('ingredients'),
-                amount=ingr.get('amount')
+        '''Сохраняет только поля рецепта из запроса: счётчики, рейтинги и
+        отметка об обработанном изображении меняются отдельно и не
+        перезаписываются значениями, загруженными до их изменения'''
+        fields = ['text', 'name', 'cooking_time']
+        for field in fields:
+            setattr(instance, field, validated_data.get(
+                field, getattr(instance, field)
+            ))
+        if 'image' in validated_data:
+            image_name = instance.image.name
+            # То же изображение получит имя уже сохранённого файла
+            instance.image.save(
+                validated_data['image'].name, validated_data['image'],
+                save=False
             )
-        instance.save()
+            if instance.image.name != image_name:
+                fields.append('image')
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data['tags'])
+        if 'ingredients' in validated_data:
+            self.set_ingredients(instance, validated_data['ingredients'])
+        instance.save(update_fields=fields)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            (instance,),
+            Prefetch(
+                'recipes_ingr',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredients'
+                )
+            ),
+            'tags'
+        )
         res = RecipeViewSerializer(
             instance, context={'request': self.context.get('request')}
         )
@@ -168,19 +353,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
+    image = RecipeImageField('thumbnail')
 
     class Meta:
         fields = ('id', 'name', 'image', 'cooking_time')
         model = Recipe
 
 
-class FollowerSerializer(serializers.ModelSerializer):
-    is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-    recipes = ShoppingCartSerializer(
-        read_only=True,
-        many=True
-    )
+class FollowerSerializer(UserSerializer):
+    recipes = serializers.SerializerMethodField()
 
     class Meta:
         fields = tuple(User.REQUIRED_FIELDS) + (
@@ -188,12 +369,20 @@ class FollowerSerializer(serializers.ModelSerializer):
         )
         model = User
 
-    def get_is_subscribed(self, obj):
-        req = self.context.get('request')
-        user = req.user
-        if user.is_authenticated:
-            return user.follower.filter(author=obj).exists()
-        return False
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    @staticmethod
+    def get_recipes_limit(request):
+        '''Значение ?recipes_limit= или None, если ограничения нет'''
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
+    def get_recipes(self, obj):
+        recipes = obj.recipes.all()
+        limit = self.get_recipes_limit(self.context.get('request'))
+        if limit is not None:
+            recipes = recipes[:limit]
+        return ShoppingCartSerializer(
+            recipes, many=True, context=self.context
+        ).data
@@ -0,0 +1,240 @@
+import asyncio
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+# Частые чтения: список и страница рецепта, поиск ингредиентов, теги
+HOT_READ_RE = re.compile(r'^/api/(recipes/(\d+/)?|ingredients/|tags/)$')
+HOT_READ_METHODS = ('GET', 'HEAD')
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+def build_environ(scope, body, size):
+    '''Окружение WSGI для запроса ASGI: тело уже прочитано в body'''
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        # Длина известна, даже если клиент слал тело частями
+        'CONTENT_LENGTH': str(size),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = (
+            scope['client'][0], str(scope['client'][1])
+        )
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name != 'CONTENT_TYPE':
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ThreadPoolASGIHandler:
+    '''Приложение ASGI поверх WSGI-приложения Django 2.2
+
+    Асинхронных представлений в Django 2.2 нет, поэтому асинхронно
+    обслуживается всё, что вне представления: цикл событий читает тело
+    запроса и отдаёт ответ, и медленный клиент не занимает поток.
+    Представления с запросами к БД выполняются в ограниченных пулах
+    потоков: частые чтения (HOT_READ_RE) — в своём пуле ASGI_READ_THREADS,
+    остальное — в ASGI_THREADS, чтобы записи и загрузки изображений не
+    отнимали потоки у чтений. Без пула соединений (DB_POOL_SIZE) у каждого
+    потока своё соединение с БД.
+
+    Ответ до ASGI_RESPONSE_BUFFER байт поток собирает целиком и
+    освобождается; больший (например, потоковый список покупок) отдаётся
+    частями, и поток ждёт, пока клиент их примет.
+    '''
+
+    def __init__(self, wsgi_application):
+        self.wsgi_application = wsgi_application
+        self.read_executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_READ_THREADS,
+            thread_name_prefix='asgi-read'
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип запроса {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.read_executor.shutdown(wait=True)
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_executor(self, scope):
+        if scope['method'] in HOT_READ_METHODS and HOT_READ_RE.match(
+            scope['path']
+        ):
+            return self.read_executor
+        return self.executor
+
+    @staticmethod
+    async def read_body(receive, max_size):
+        '''Тело запроса во временный файл, без потока из пула
+
+        None — клиент отключился, не дослав тело. Тело больше max_size
+        байт не дочитывается: RequestBodyTooLarge.
+        '''
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        size = 0
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    body.close()
+                    return None, 0
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if size > max_size:
+                    raise RequestBodyTooLarge
+                body.write(chunk)
+                if not message.get('more_body', False):
+                    body.seek(0)
+                    return body, size
+        except BaseException:
+            body.close()
+            raise
+
+    @staticmethod
+    def declared_size(scope):
+        '''Значение Content-Length или None'''
+        for name, value in scope['headers']:
+            if name.lower() == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @staticmethod
+    async def reject_too_large(send):
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'connection', b'close'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': 'Тело запроса слишком большое'.encode(),
+        })
+
+    async def http(self, scope, receive, send):
+        '''Тело больше ASGI_MAX_BODY_SIZE (как DATA_UPLOAD_MAX_MEMORY_SIZE
+        у Django) отклоняется до записи на диск'''
+        max_size = settings.ASGI_MAX_BODY_SIZE
+        declared = self.declared_size(scope)
+        if declared is not None and declared > max_size:
+            await self.reject_too_large(send)
+            return
+        try:
+            body, size = await self.read_body(receive, max_size)
+        except RequestBodyTooLarge:
+            await self.reject_too_large(send)
+            return
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        try:
+            buffered = await loop.run_in_executor(
+                self.get_executor(scope), self.run_wsgi,
+                build_environ(scope, body, size), loop, send
+            )
+        finally:
+            body.close()
+        if buffered is not None:
+            start, content = buffered
+            await send(start)
+            await send({'type': 'http.response.body', 'body': content})
+
+    def run_wsgi(self, environ, loop, send):
+        '''Выполняется в потоке пула
+
+        Возвращает начало ответа и тело, если ответ уместился в буфер;
+        иначе отправляет его сам и возвращает None.
+        '''
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            start.update(
+                type='http.response.start',
+                status=int(status.split(' ', 1)[0]),
+                headers=[
+                    (name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in headers
+                ],
+            )
+
+        def send_now(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = self.wsgi_application(environ, start_response)
+        chunks, buffered_size, streaming = [], 0, False
+        try:
+            for chunk in response:
+                if streaming:
+                    send_now({
+                        'type': 'http.response.body', 'body': chunk,
+                        'more_body': True,
+                    })
+                    continue
+                chunks.append(chunk)
+                buffered_size += len(chunk)
+                if buffered_size > settings.ASGI_RESPONSE_BUFFER:
+                    streaming = True
+                    send_now(start)
+                    send_now({
+                        'type': 'http.response.body',
+                        'body': b''.join(chunks), 'more_body': True,
+                    })
+        finally:
+            # request_finished возвращает соединение с БД этого потока в
+            # пул или закрывает устаревшее
+            if hasattr(response, 'close'):
+                response.close()
+        if streaming:
+            send_now({'type': 'http.response.body', 'body': b''})
+            return None
+        return start, b''.join(chunks)
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (
+    ALL,
+    CATALOG,
+    INGREDIENTS,
+    TAGS,
+    author_namespace,
+    bump_versions,
+    tag_namespace,
+)
+from recipes.models import (
+    Ingredients,
+    Recipe,
+    RecipeIngredients,
+    RecipeTag,
+    Tag,
+)
+
+
+def recipe_namespaces(recipe_ids, tag_ids=()):
+    '''Пространства кеша, в списках которых выводятся эти рецепты'''
+    namespaces = {ALL}
+    rows = Recipe.objects.filter(id__in=recipe_ids).values_list(
+        'author_id', 'tags__slug'
+    )
+    for author_id, slug in rows:
+        if author_id is not None:
+            namespaces.add(author_namespace(author_id))
+        if slug is not None:
+            namespaces.add(tag_namespace(slug))
+    if tag_ids:
+        namespaces.update(
+            tag_namespace(slug) for slug in Tag.objects.filter(
+                id__in=tag_ids
+            ).values_list('slug', flat=True)
+        )
+    return namespaces
+
+
+def bump_on_commit(namespaces):
+    transaction.on_commit(lambda: bump_versions(namespaces))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    namespaces = recipe_namespaces((instance.id,))
+    if instance.author_id is not None:
+        namespaces.add(author_namespace(instance.author_id))
+    bump_on_commit(namespaces)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    bump_on_commit(recipe_namespaces((instance.recipe_id,)))
+
+
+@receiver((post_save, post_delete), sender=RecipeTag)
+def invalidate_recipe_tag(sender, instance, **kwargs):
+    bump_on_commit(
+        recipe_namespaces((instance.recipe_id,), (instance.tag_id,))
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        namespaces = recipe_namespaces(pk_set or (), (instance.id,))
+    else:
+        namespaces = recipe_namespaces((instance.id,), pk_set or ())
+    bump_on_commit(namespaces)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_on_commit((CATALOG, TAGS))
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def invalidate_ingredients(sender, **kwargs):
+    bump_on_commit((CATALOG, INGREDIENTS))
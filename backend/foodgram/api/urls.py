@@ -10,6 +10,7 @@ from api.views import (
     ShoppingCartViewSet,
     SubscribeViewSet,
     TagViewSet,
+    instrumentation_stats,
     shopping_cart_txt,
 )
 
@@ -26,6 +27,7 @@ urlpatterns = [
         ShoppingCartViewSet.as_view()
     ),
     path('recipes/download_shopping_cart/', shopping_cart_txt),
+    path('instrumentation/', instrumentation_stats),
     path('auth/', include('djoser.urls.authtoken')),
     path('users/<int:user_id>/subscribe/', SubscribeViewSet.as_view()),
     path('', include(router_v1.urls)),
@@ -1,14 +1,33 @@
-from rest_framework import viewsets, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import serializers, viewsets, status
+from rest_framework.decorators import (
+    action, api_view, permission_classes, renderer_classes
+)
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.generics import CreateAPIView, DestroyAPIView
 from django.core.exceptions import ValidationError
 
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Prefetch, Subquery, Sum, Value
+)
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
+from api import metrics
+from api.cache import INGREDIENTS, TAGS, recipe_list_key
+from api.filters import RecipeFilter
+from api.instrumentation import route_stats
+from api.mixins import CatalogCacheMixin
+from api.pagination import FeedPagination
 from api.serializers import (
+    CookableRecipeSerializer,
     FollowerSerializer,
     IngredientsSerializer,
     RecipeSerializer,
@@ -18,69 +37,179 @@ from api.serializers import (
 )
 
 from users.models import Follow
+from recipes.cookable import cookable_index
 from recipes.models import (
     Favorite,
     Ingredients,
     Recipe,
+    RecipeIngredients,
     ShoppingCart,
     Tag,
     User
 )
+from recipes.search import ingredients_index, search_ingredients_db
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    catalog_namespace = TAGS
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+class IngredientsViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    catalog_namespace = INGREDIENTS
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
     pagination_class = None
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        params = self.request.query_params
-        if 'name' in params:
-            queryset = queryset.filter(
-                name__startswith=params['name']
-            ) | queryset.filter(
-                name__contains=params['name']
+        name = self.request.query_params.get('name')
+        if not name or self.action != 'list':
+            return queryset
+        if settings.INGREDIENTS_INDEX_ENABLED:
+            return ingredients_index.search(
+                name, settings.INGREDIENTS_SEARCH_LIMIT
             )
-        return queryset
+        return search_ingredients_db(
+            queryset, name, settings.INGREDIENTS_SEARCH_LIMIT
+        )
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'ingredients', 'tags'
+    queryset = Recipe.objects.prefetch_related(
+        Prefetch(
+            'recipes_ingr',
+            queryset=RecipeIngredients.objects.select_related('ingredients')
+        ),
+        'tags'
     ).all()
     serializer_class = RecipeViewSerializer
+    pagination_class = FeedPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = RecipeFilter
+    # Параметры, от которых зависит кешируемый анонимный список
+    cache_params = (
+        'author', 'cooking_time_max', 'cooking_time_min', 'cursor',
+        'ingredients', 'limit', 'ordering', 'page', 'search', 'tags',
+        'tags_mode'
+    )
+    orderings = {
+        'popular': ('-popularity', '-id'),
+        'trending': ('-trending', '-id'),
+    }
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = recipe_list_key(request, self.cache_params)
+        data = cache.get(key)
+        metrics.inc('foodgram_cache_requests_total', {
+            'cache': 'recipe_list', 'result': 'miss' if data is None else 'hit'
+        })
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, settings.RECIPES_CACHE_TIMEOUT)
+        return Response(data)
+
+    def annotate_user_flags(self, queryset):
+        '''Флаги избранного, корзины и подписки одним запросом на страницу'''
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.select_related('author').annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        authors = User.objects.annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        )
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors)
+        ).annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.annotate_user_flags(super().get_queryset())
+        return queryset.order_by(*self.get_ordering())
+
+    def get_ordering(self):
+        '''Порядок ленты: ?ordering=popular или trending, иначе новые
+
+        При поиске без ?ordering сначала идут самые релевантные рецепты.
+        '''
         params = self.request.query_params
-        if self.request.user.is_authenticated:
-            user = self.request.user
-            if 'is_favorited' in params:
-                if params['is_favorited']:
-                    queryset = queryset.filter(
-                        id__in=user.favorites.values_list('recipe', flat=True)
-                    )
-            elif 'is_in_shopping_cart' in params:
-                if params['is_in_shopping_cart']:
-                    queryset = queryset.filter(
-                        id__in=user.user_shopps.values_list(
-                            'recipe', flat=True)
-                    )
-            elif 'author' in params:
-                author = get_object_or_404(User, id=params['author'])
-                queryset = author.recipes.all()
-        if 'tags' in params:
-            return queryset.filter(
-                tags__slug__in=params.getlist('tags')
-            ).distinct()
-        return queryset
+        default = Recipe._meta.ordering
+        if params.get('search', '').strip():
+            default = ('-rank', '-id')
+        return self.orderings.get(params.get('ordering'), default)
+
+    @staticmethod
+    def get_cookable_params(params):
+        '''Продукты пользователя: ?ingredients=1&ingredients=2 или 1,2'''
+        try:
+            ingredients = {
+                int(value)
+                for values in params.getlist('ingredients')
+                for value in values.split(',') if value
+            }
+            max_missing = params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            raise serializers.ValidationError(
+                {'errors': 'Ожидаются целые числа'}
+            )
+        if not ingredients:
+            raise serializers.ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент'}
+            )
+        if len(ingredients) > settings.COOKABLE_MAX_INGREDIENTS:
+            raise serializers.ValidationError({
+                'ingredients': 'Не больше '
+                f'{settings.COOKABLE_MAX_INGREDIENTS} ингредиентов'
+            })
+        return ingredients, max_missing
+
+    @action(detail=False, methods=('get',))
+    def cookable(self, request):
+        '''Что приготовить из имеющихся продуктов
+
+        Порядок и число недостающих ингредиентов считаются по индексу
+        в памяти; из БД загружается только текущая страница рецептов.
+        '''
+        ingredients, max_missing = self.get_cookable_params(
+            request.query_params
+        )
+        matched = cookable_index.match(ingredients, max_missing)
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(matched, request, self)
+        recipes = self.annotate_user_flags(
+            super().get_queryset()
+        ).in_bulk([recipe_id for recipe_id, _ in page])
+        result = []
+        for recipe_id, missing in page:
+            if recipe_id in recipes:
+                recipes[recipe_id].missing_count = missing
+                result.append(recipes[recipe_id])
+        serializer = CookableRecipeSerializer(
+            result, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'cookable'):
+            context['image_size'] = 'feed'
+        return context
 
     def get_serializer_class(self):
         if self.request.method in ('PATCH', 'POST',):
@@ -98,7 +227,8 @@ class ShoppingCartViewSet(CreateAPIView, DestroyAPIView):
         user = request.user
         try:
             recipe = get_object_or_404(Recipe, id=recipe_id)
-            ShoppingCart.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                ShoppingCart.objects.create(user=user, recipe=recipe)
             res = ShoppingCartSerializer(recipe)
             return Response(res.data, status=status.HTTP_201_CREATED)
         except IntegrityError:
@@ -122,7 +252,8 @@ class FavoriteRecipeViewSet(CreateAPIView, DestroyAPIView):
     def create(self, request, recipe_id):
         try:
             recipe = get_object_or_404(Recipe, id=recipe_id)
-            Favorite.objects.create(user=request.user, recipe=recipe)
+            with transaction.atomic():
+                Favorite.objects.create(user=request.user, recipe=recipe)
             res = ShoppingCartSerializer(recipe)
             return Response(res.data, status=status.HTTP_201_CREATED)
         except IntegrityError:
@@ -144,13 +275,36 @@ class FavoriteRecipeViewSet(CreateAPIView, DestroyAPIView):
 class FollowViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = FollowerSerializer
+    pagination_class = FeedPagination
+    permission_classes = (IsAuthenticated,)
     http_method_names = ['get']
 
     def get_queryset(self):
+        '''Подписки с числом рецептов и первыми recipes_limit рецептами
+
+        Рецепты всех авторов страницы загружаются одним запросом:
+        для каждого берутся id его последних recipes_limit рецептов.
+        '''
         user = self.request.user
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'processed_image', 'cooking_time', 'author'
+        )
+        limit = FollowerSerializer.get_recipes_limit(self.request)
+        if limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-id').values('id')[:limit]
+            ))
         return User.objects.filter(
             id__in=user.follower.values_list('author', flat=True)
-        )
+        ).annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        ).order_by('-id')
 
 
 class SubscribeViewSet(CreateAPIView, DestroyAPIView):
@@ -160,7 +314,8 @@ class SubscribeViewSet(CreateAPIView, DestroyAPIView):
         user = request.user
         sub = get_object_or_404(User, id=user_id)
         try:
-            Follow.objects.create(user=user, author=sub)
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=sub)
             res = FollowerSerializer(sub, context={'request': request})
             return Response(data=res.data, status=status.HTTP_201_CREATED)
         except IntegrityError:
@@ -178,8 +333,7 @@ class SubscribeViewSet(CreateAPIView, DestroyAPIView):
         user = request.user
         sub = get_object_or_404(User, id=user_id)
         try:
-            remove = user.follower.get(author=sub)
-            remove.delete()
+            user.follower.get(author=sub).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except ObjectDoesNotExist:
             return Response(
@@ -190,24 +344,68 @@ class SubscribeViewSet(CreateAPIView, DestroyAPIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET'])
+@permission_classes((IsAuthenticated,))
 def shopping_cart_txt(request):
-    if request.user.is_authenticated:
-        user = request.user
-        response = HttpResponse(content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename=shopping_cart.txt'
-        shop_list = {}
-        recipes = user.user_shopps.all()
-        for recipe in recipes:
-            for ingred in recipe.recipe.recipes_ingr.all():
-                key = (f'{ingred.ingredients} '
-                       f'({ingred.ingredients.measurement_unit}) - ')
-                if key in shop_list:
-                    shop_list[key] += ingred.amount
-                else:
-                    shop_list[key] = ingred.amount
-        for k, v in shop_list.items():
-            response.writelines(f'{k}{v}\n')
-        return response
-    return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    shop_list = RecipeIngredients.objects.filter(
+        recipe__shop_cart_recipe__user=request.user
+    ).values(
+        'ingredients__name', 'ingredients__measurement_unit'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by('ingredients__name')
+    response = StreamingHttpResponse(
+        (
+            f'{ingred["ingredients__name"]} '
+            f'({ingred["ingredients__measurement_unit"]}) - '
+            f'{ingred["total"]}\n'
+            for ingred in shop_list.iterator()
+        ),
+        content_type='text/plain'
+    )
+    response[
+        'Content-Disposition'
+    ] = 'attachment; filename=shopping_cart.txt'
+    return response
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes((IsAdminUser,))
+def instrumentation_stats(request):
+    '''Перцентили времени и запросы к БД по маршрутам этого процесса'''
+    if request.method == 'DELETE':
+        route_stats.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': settings.INSTRUMENTATION_ENABLED,
+        'routes': route_stats.snapshot(),
+    })
+
+
+class PlainTextRenderer(BaseRenderer):
+    '''Ответ с Accept: text/plain, как у Prometheus; через рендерер
+    проходят только ошибки, метрики отдаются готовым текстом'''
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get('detail', '')
+        return str(data).encode(self.charset)
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser,))
+@renderer_classes((JSONRenderer, PlainTextRenderer))
+def metrics_export(request):
+    '''Метрики всех воркеров в текстовом формате Prometheus
+
+    Адрес не проксируется nginx и доступен только из сети контейнеров;
+    Prometheus авторизуется токеном пользователя с is_staff.
+    '''
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
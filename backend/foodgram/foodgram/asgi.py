@@ -0,0 +1,21 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.2 has no ASGI handler of its own, so the WSGI application is served
+through api.serving.ThreadPoolASGIHandler, e.g.:
+
+    gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+wsgi_application = get_wsgi_application()
+
+from api.serving import ThreadPoolASGIHandler  # noqa: E402
+
+application = ThreadPoolASGIHandler(wsgi_application)
@@ -0,0 +1,111 @@
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from foodgram.postgresql.pool import ConnectionPool
+
+# Пулы процесса: {(pid, псевдоним БД): пул}. После fork у воркера
+# gunicorn свои пулы, соединения родителя не используются
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=options.get('max_size', 10),
+                timeout=options.get('timeout', 10),
+                max_idle=options.get('max_idle', 300),
+            )
+        return _pools[key]
+
+
+def close_pool(alias):
+    with _pools_lock:
+        pool = _pools.pop((os.getpid(), alias), None)
+    if pool is not None:
+        pool.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''PostgreSQL с проверкой соединений и необязательным пулом
+
+    CONN_HEALTH_CHECKS (как в Django 4.1): постоянное соединение
+    (CONN_MAX_AGE > 0) проверяется SELECT 1 перед первым запросом к БД в
+    очередном HTTP-запросе, и вместо оборванного соединения открывается
+    новое, а не возвращается ошибка.
+
+    OPTIONS['pool'] (как в Django 5.1): соединение берётся из пула
+    процесса на время HTTP-запроса и в конце возвращается в него, поэтому
+    потоков gthread или ASGI может быть больше, чем соединений. С
+    проверкой соединений выдаваемое из пула соединение тоже проверяется.
+    '''
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        self.pool_options = self.settings_dict['OPTIONS'].get('pool')
+        self.health_checks = self.settings_dict.get('CONN_HEALTH_CHECKS')
+        self.health_check_done = False
+        self.connection_pool = None
+        if self.pool_options and self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                'С пулом соединений CONN_MAX_AGE должен быть 0: соединение '
+                'возвращается в пул в конце каждого запроса'
+            )
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def check_pooled(self, connection):
+        try:
+            connection.cursor().execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_options:
+            return super().get_new_connection(conn_params)
+        self.connection_pool = get_pool(self.alias, self.pool_options)
+        connection = self.connection_pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            self.check_pooled if self.health_checks else None
+        )
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection_pool is None or self.connection is None:
+            super()._close()
+            return
+        pool, self.connection_pool = self.connection_pool, None
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Обёртка сохранит ссылку на соединение до конца atomic:
+                # отдать его другому потоку нельзя
+                pool.discard(self.connection)
+            else:
+                pool.release(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Вызывается в начале и в конце каждого HTTP-запроса
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.health_checks and not self.health_check_done
+            and self.connection is not None and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+        self.health_check_done = True
+        super().ensure_connection()
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class ConnectionPool:
+    '''Пул соединений psycopg2 одного процесса
+
+    Открытых соединений не больше max_size: поток, которому не хватило
+    соединения, ждёт до timeout секунд. Свободные соединения выдаются
+    начиная с последнего возвращённого, а пролежавшие без дела дольше
+    max_idle секунд закрываются, чтобы их не оборвал сервер или
+    pgbouncer. Соединение с незавершённой транзакцией или ошибкой в пул
+    не возвращается.
+    '''
+
+    def __init__(self, max_size, timeout, max_idle):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        # (соединение, время возврата), последнее возвращённое — справа
+        self._idle = deque()
+
+    def _take_idle(self):
+        '''Свежее свободное соединение, устаревшие закрываются'''
+        expired = []
+        connection = None
+        with self._lock:
+            deadline = time.monotonic() - self.max_idle
+            while self._idle and self._idle[0][1] < deadline:
+                expired.append(self._idle.popleft()[0])
+            if self._idle:
+                connection = self._idle.pop()[0]
+        for stale in expired:
+            stale.close()
+        return connection
+
+    def acquire(self, connect, check=None):
+        '''Соединение из пула или новое через connect()
+
+        check — проверка свободного соединения перед выдачей; не
+        прошедшее её соединение закрывается.
+        '''
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Нет свободных соединений в пуле за {self.timeout} с '
+                f'(размер пула {self.max_size})'
+            )
+        try:
+            connection = self._take_idle()
+            while connection is not None:
+                if check is None or check(connection):
+                    return connection
+                connection.close()
+                connection = self._take_idle()
+            return connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        '''Возврат соединения в пул, повреждённое закрывается'''
+        try:
+            if connection.closed:
+                return
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.close()
+                return
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            connection.close()
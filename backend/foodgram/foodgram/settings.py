@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +62,37 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замеры запросов к БД и времени ответа, см. api/middleware.py
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED') == 'True'
+# Сколько последних запросов маршрута учитывать в перцентилях
+INSTRUMENTATION_WINDOW = 1000
+# Шаблон запроса, выполненный больше стольких раз за запрос, — N+1
+INSTRUMENTATION_N_PLUS_ONE = 5
+
+# Метрики для Prometheus на /metrics, см. api/metrics.py. Каждый процесс
+# пишет свой файл в METRICS_DIR, каталог общий для воркеров gunicorn
+METRICS_ENABLED = os.getenv('METRICS_ENABLED') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR') or os.path.join(
+    tempfile.gettempdir(), 'foodgram_metrics'
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
@@ -84,16 +118,62 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+DB_ENGINE = os.getenv('DB_ENGINE', default='foodgram.postgresql')
+# Пул соединений процесса, 0 — без пула. Пул и проверка соединений есть
+# только в бэкенде foodgram.postgresql: psycopg2 не принимает ключ pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE') or 0)
+if DB_ENGINE != 'foodgram.postgresql':
+    DB_POOL_SIZE = 0
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='foodgarm'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='qwerty'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Секунд жизни постоянного соединения; с пулом соединение
+        # возвращается в него после каждого запроса
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(
+            os.getenv('DB_CONN_MAX_AGE') or 60
+        ),
+        # pgbouncer в режиме transaction: курсоры на стороне сервера
+        # живут дольше транзакции и недоступны
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER') == 'True',
+        'OPTIONS': {},
+    }
+}
+if DB_ENGINE == 'foodgram.postgresql':
+    # Проверка постоянного соединения перед первым запросом к БД
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = (
+        os.getenv('DB_HEALTH_CHECKS') != 'False'
+    )
+    if DB_POOL_SIZE:
+        DATABASES['default']['OPTIONS']['pool'] = {'max_size': DB_POOL_SIZE}
+
+# Версии кешей рецептов общие для всех воркеров только в общем кеше:
+# Redis включается адресом CACHE_LOCATION=redis://...
+CACHE_LOCATION = os.getenv('CACHE_LOCATION') or 'foodgram'
+if os.getenv('CACHE_BACKEND'):
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND')
+elif CACHE_LOCATION.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHE_BACKEND = 'django_redis.cache.RedisCache'
+else:
+    CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
     }
 }
+# В LocMemCache у каждого процесса свои версии: изменение в другом
+# воркере станет видно не позже чем через столько секунд
+CACHE_VERSIONS_TIMEOUT = int(os.getenv('CACHE_VERSIONS_TIMEOUT') or 0) or (
+    None if CACHE_BACKEND == 'django_redis.cache.RedisCache' else 30
+)
+
+RECIPES_CACHE_TIMEOUT = 60 * 5
 
 
 # Password validation
@@ -148,6 +228,34 @@ DJOSER = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Копии изображений рецептов: миниатюра, лента и страница рецепта
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': (240, 240),
+    'feed': (720, 720),
+    'detail': (1280, 1280),
+}
+RECIPE_IMAGE_FORMAT = 'WEBP'
+# Ограничения загружаемого изображения: байты после декодирования base64
+# и пиксели; до RECIPE_IMAGE_SPOOL_SIZE байт файл держится в памяти
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 6000 * 6000
+RECIPE_IMAGE_SPOOL_SIZE = 1024 * 1024
+# Тело JSON с изображением в base64 на треть больше самого изображения
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+RECIPE_IMAGE_QUALITY = 80
+# 0 — обрабатывать сразу после коммита, без пула потоков
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS') or 2)
+
+# Режим ASGI (foodgram/asgi.py): потоки для представлений в каждом воркере.
+# Частые чтения идут в свой пул. Без DB_POOL_SIZE у каждого потока своё
+# соединение с БД
+ASGI_READ_THREADS = int(os.getenv('ASGI_READ_THREADS') or 8)
+ASGI_THREADS = int(os.getenv('ASGI_THREADS') or 4)
+# Ответ больше этого отдаётся частями из потока пула
+ASGI_RESPONSE_BUFFER = 1024 * 1024
+# Тело запроса больше этого отклоняется с кодом 413, не дочитываясь
+ASGI_MAX_BODY_SIZE = DATA_UPLOAD_MAX_MEMORY_SIZE
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
@@ -161,6 +269,23 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Вклад добавления в избранное и в список покупок в популярность рецепта
+POPULARITY_WEIGHTS = {
+    'favorites_count': 2,
+    'in_carts_count': 1,
+}
+# Период полураспада вклада события в trending, в секундах
+TRENDING_HALF_LIFE = 60 * 60 * 24 * 3
+
+# Конфигурация полнотекстового поиска рецептов в PostgreSQL
+RECIPES_SEARCH_CONFIG = 'russian'
+
+INGREDIENTS_SEARCH_LIMIT = 20
+INGREDIENTS_INDEX_ENABLED = True
+
+# Подбор рецептов по имеющимся продуктам: /api/recipes/cookable/
+COOKABLE_INDEX_TTL = 300
+COOKABLE_MAX_INGREDIENTS = 100
 
 EMAIL_ADMIN = 'Admin@admin.com'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
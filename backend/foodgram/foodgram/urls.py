@@ -18,7 +18,10 @@ from django.urls import include, path
 from django.conf.urls.static import static
 from django.conf import settings
 
+from api.views import metrics_export
+
 urlpatterns = [
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_export),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
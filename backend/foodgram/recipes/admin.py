@@ -37,18 +37,28 @@ class IngredientsInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'added_in_favorite')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     list_filter = ('author', 'name', 'tags')
     search_fields = ('author', 'name')
+    readonly_fields = ('favorites_count', 'in_carts_count', 'popularity')
     inlines = (TagsInline, IngredientsInline)
 
-    def added_in_favorite(self, obj):
-        return obj.favorite_users.count()
-
-    added_in_favorite.short_description = 'Добавлено в избранное'
+    def save_model(self, request, obj, form, change):
+        '''Счётчики и рейтинги рецепта не редактируются и меняются
+        запросами F(): при изменении рецепта они не перезаписываются
+        значениями, загруженными вместе с формой'''
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=[
+            field.name for field in Recipe._meta.concrete_fields
+            if field.editable and not field.primary_key
+        ])
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = (
+        'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count'
+    )
     search_fields = ('username', 'email')
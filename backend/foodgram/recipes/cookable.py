@@ -0,0 +1,113 @@
+import bisect
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+
+from recipes.models import RecipeIngredients
+
+
+class CookableIndex:
+    '''Обратный индекс «ингредиент → рецепты» в памяти процесса
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта — кортеж id его ингредиентов. Подбор рецептов по
+    набору продуктов пользователя — подсчёт вхождений по массивам без
+    запросов к БД. Изменённые рецепты обновляются сигналами точечно;
+    весь индекс перестраивается через COOKABLE_INDEX_TTL секунд, чтобы
+    подхватить изменения, сделанные другими процессами.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._recipes = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._recipes = None
+
+    def _build(self):
+        postings = {}
+        recipes = {}
+        rows = RecipeIngredients.objects.order_by(
+            'ingredients_id', 'recipe_id'
+        ).values_list('ingredients_id', 'recipe_id').iterator()
+        for ingredient_id, recipe_id in rows:
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array('L')
+            postings[ingredient_id].append(recipe_id)
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        self._postings = postings
+        self._recipes = {
+            recipe_id: tuple(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+        self._built_at = time.monotonic()
+
+    def _load(self):
+        with self._lock:
+            expired = (
+                time.monotonic() - self._built_at
+                > settings.COOKABLE_INDEX_TTL
+            )
+            if self._postings is None or expired:
+                self._build()
+            return self._postings, self._recipes
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings[ingredient_id]
+            del posting[bisect.bisect_left(posting, recipe_id)]
+            if not posting:
+                del self._postings[ingredient_id]
+
+    def refresh(self, recipe_ids):
+        '''Перечитывает из БД ингредиенты рецептов, удалённые — убирает'''
+        recipe_ids = set(recipe_ids)
+        recipes = {}
+        for recipe_id, ingredient_id in RecipeIngredients.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredients_id'):
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        with self._lock:
+            if self._postings is None:
+                return
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+            for recipe_id, ingredient_ids in recipes.items():
+                for ingredient_id in ingredient_ids:
+                    if ingredient_id not in self._postings:
+                        self._postings[ingredient_id] = array('L')
+                    bisect.insort(self._postings[ingredient_id], recipe_id)
+                self._recipes[recipe_id] = tuple(ingredient_ids)
+
+    def match(self, ingredient_ids, max_missing=None):
+        '''Рецепты, где есть хотя бы один из продуктов пользователя
+
+        Возвращает пары (id рецепта, сколько ингредиентов не хватает):
+        сначала рецепты, которые можно приготовить целиком, затем с
+        наименьшим числом недостающих, при равенстве — новые.
+        '''
+        postings, recipes = self._load()
+        found = Counter()
+        for ingredient_id in set(ingredient_ids):
+            found.update(postings.get(ingredient_id, ()))
+        result = []
+        for recipe_id, count in found.items():
+            ingredients = recipes.get(recipe_id)
+            if ingredients is None:
+                # Рецепт удалён, пока шёл подсчёт
+                continue
+            missing = len(ingredients) - count
+            if max_missing is None or missing <= max_missing:
+                result.append((recipe_id, missing))
+        result.sort(key=lambda item: (item[1], -item[0]))
+        return result
+
+
+cookable_index = CookableIndex()
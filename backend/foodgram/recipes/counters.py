@@ -0,0 +1,32 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def change_counter(queryset, field, delta, **updates):
+    '''Атомарно меняет счётчик выражением F(), не уводя его ниже нуля
+
+    updates — другие поля, которые нужно обновить в том же UPDATE.
+    '''
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta}, **updates)
+
+
+def count_of(model, field):
+    '''Подзапрос: число строк model, у которых field ссылается на OuterRef'''
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        Value(0)
+    )
+
+
+def recount(queryset, field, model, related_field):
+    '''Пересчитывает разошедшиеся счётчики, возвращает число исправленных'''
+    actual = count_of(model, related_field)
+    return queryset.exclude(**{field: actual}).update(**{field: actual})
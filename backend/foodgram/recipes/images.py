@@ -0,0 +1,162 @@
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to
+RENDITIONS_DIR = 'recipe/renditions/'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_format():
+    '''WebP, если Pillow собран с его поддержкой, иначе JPEG'''
+    image_format = settings.RECIPE_IMAGE_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def rendition_name(image_name, size):
+    '''recipe/images/ab/cd/<хеш>.png → recipe/renditions/ab/cd/<хеш>_WxH.webp
+
+    Размеры и формат входят в имя, поэтому файл копии с данным именем
+    никогда не меняется и его можно кешировать навсегда.
+    '''
+    width, height = settings.RECIPE_IMAGE_SIZES[size]
+    stem = os.path.splitext(posixpath.relpath(image_name, IMAGES_DIR))[0]
+    extension = 'jpg' if get_format() == 'JPEG' else get_format().lower()
+    return f'{RENDITIONS_DIR}{stem}_{width}x{height}.{extension}'
+
+
+def rendition_url(recipe, size):
+    '''Адрес копии нужного размера, пока копий нет — адрес оригинала'''
+    if not recipe.image:
+        return None
+    if recipe.processed_image == recipe.image.name:
+        return default_storage.url(rendition_name(recipe.image.name, size))
+    return recipe.image.url
+
+
+def prepare_mode(image, image_format):
+    '''Прозрачность сохраняется в WebP и PNG; для JPEG, где её нет,
+    изображение кладётся на белый фон, а не теряет альфа-канал как есть
+    '''
+    if image.mode not in ('RGBA', 'LA', 'PA') and (
+        'transparency' not in image.info
+    ):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format != 'JPEG':
+        return image
+    flat = Image.new('RGB', image.size, (255, 255, 255))
+    flat.paste(image, mask=image.getchannel('A'))
+    return flat
+
+
+def render(image, box):
+    '''Уменьшенная копия без EXIF: Pillow не переносит метаданные сам'''
+    copy = image.copy()
+    copy.thumbnail(box, Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(
+        buffer, get_format(), quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True
+    )
+    return buffer.getvalue()
+
+
+def make_renditions(image_name, force=False):
+    '''Создаёт недостающие копии: у того же изображения другого рецепта
+    они уже могут быть
+
+    С force=True пересоздаются все копии, например после изменения
+    RECIPE_IMAGE_QUALITY: оно не входит в имя файла копии.
+    '''
+    missing = {
+        name: box for name, box in (
+            (rendition_name(image_name, size), box)
+            for size, box in settings.RECIPE_IMAGE_SIZES.items()
+        )
+        if force or not default_storage.exists(name)
+    }
+    if not missing:
+        return
+    with Recipe._meta.get_field('image').storage.open(image_name) as file:
+        image = prepare_mode(
+            ImageOps.exif_transpose(Image.open(file)), get_format()
+        )
+    for name, box in missing.items():
+        content = ContentFile(render(image, box))
+        # Иначе хранилище сохранит копию под другим именем
+        default_storage.delete(name)
+        default_storage.save(name, content)
+
+
+def process_recipe_image(recipe_id, image_name, force=False):
+    '''Готовит копии изображения и отмечает рецепт обработанным
+
+    Если за время обработки изображение рецепта сменилось, отметка не
+    ставится: новое изображение обработает своя задача.
+    '''
+    make_renditions(image_name, force)
+    recipe = Recipe.objects.filter(id=recipe_id, image=image_name).first()
+    if recipe is not None:
+        recipe.processed_image = image_name
+        # save, а не update: сигналы сбросят кеш списков рецептов
+        recipe.save(update_fields=('processed_image',))
+
+
+def process_safely(recipe_id, image_name, force=False):
+    try:
+        process_recipe_image(recipe_id, image_name, force)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение %s рецепта %s',
+            image_name, recipe_id
+        )
+
+
+def run_job(recipe_id, image_name):
+    '''Задача пула: у потока своё соединение с БД, его нужно закрывать'''
+    close_old_connections()
+    try:
+        process_safely(recipe_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+        return _executor
+
+
+def schedule_processing(recipe_id, image_name):
+    '''Обработка в пуле потоков, вне запроса
+
+    Задачи, потерянные при перезапуске процесса, доделывает команда
+    process_images.
+    '''
+    if settings.IMAGE_PROCESSING_WORKERS:
+        get_executor().submit(run_job, recipe_id, image_name)
+    else:
+        process_safely(recipe_id, image_name)
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.instrumentation import percentile
+from recipes.models import Ingredients
+from recipes.search import ingredients_index, search_ingredients_db
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время поиска ингредиентов в памяти и через ORM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            'queries', nargs='*', default=['а', 'мо', 'сыр', 'молок', 'соус']
+        )
+
+    def measure(self, search, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), percentile(timings, 0.95)
+
+    def handle(self, *args, **options):
+        repeat, limit = options['repeat'], options['limit']
+        ingredients_index.invalidate()
+        start = time.perf_counter()
+        ingredients_index.search('', limit)
+        self.stdout.write(
+            f'Индекс построен за {(time.perf_counter() - start) * 1000:.1f} '
+            f'мс, ингредиентов: {Ingredients.objects.count()}'
+        )
+        paths = (
+            ('index', lambda query: ingredients_index.search(query, limit)),
+            ('orm', lambda query: list(search_ingredients_db(
+                Ingredients.objects.all(), query, limit
+            ))),
+        )
+        for query in options['queries']:
+            for title, search in paths:
+                median, p95 = self.measure(search, query, repeat)
+                self.stdout.write(
+                    f'{query!r:>10} {title:>5}: '
+                    f'p50 {median:.3f} мс, p95 {p95:.3f} мс'
+                )
@@ -0,0 +1,70 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import IMAGES_DIR, RENDITIONS_DIR, rendition_name
+from recipes.models import Recipe
+
+
+def walk(storage, directory):
+    '''Имена всех файлов каталога хранилища, включая вложенные'''
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их копии, на которые не ссылается '
+        'ни один рецепт'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: рецепт с ними '
+                 'может быть ещё не сохранён'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def referenced(self):
+        names = set()
+        for image_name in Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).iterator():
+            names.add(image_name)
+            names.update(
+                rendition_name(image_name, size)
+                for size in settings.RECIPE_IMAGE_SIZES
+            )
+        return names
+
+    def handle(self, *args, **options):
+        referenced = self.referenced()
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = 0
+        for storage, directory in (
+            (Recipe._meta.get_field('image').storage, IMAGES_DIR),
+            (default_storage, RENDITIONS_DIR),
+        ):
+            if not storage.exists(directory):
+                continue
+            for name in walk(storage, directory.rstrip('/')):
+                if (
+                    name in referenced
+                    or storage.get_modified_time(name) > threshold
+                ):
+                    continue
+                removed += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    storage.delete(name)
+        action = 'Можно удалить' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {removed}'))
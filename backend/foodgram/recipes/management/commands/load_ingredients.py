@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import CATALOG, INGREDIENTS, bump_versions
+from recipes.models import Ingredients
+from recipes.search import ingredients_index
+
+NAME_MAX_LENGTH = Ingredients._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredients._meta.get_field(
+    'measurement_unit'
+).max_length
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None, None
+            continue
+        yield row[0], row[1]
+
+
+def clean_record(name, unit):
+    '''Возвращает (None, None) для записи, которую нельзя загрузить'''
+    name = name.strip() if isinstance(name, str) else ''
+    unit = unit.strip() if isinstance(unit, str) else ''
+    if (
+        name and unit
+        and len(name) <= NAME_MAX_LENGTH
+        and len(unit) <= UNIT_MAX_LENGTH
+    ):
+        return name, unit
+    return None, None
+
+
+def decode_items(decoder, buffer):
+    '''Разбирает все целые элементы массива в начале буфера'''
+    items = []
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return items, buffer, True
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            return items, buffer, False
+        items.append(item)
+        buffer = buffer[end:]
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    '''Читает JSON-массив объектов по частям, не загружая файл целиком'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        buffer = chunk.lstrip()
+        if not chunk:
+            break
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    buffer = buffer[1:]
+    finished = False
+    while not finished:
+        chunk = file.read(chunk_size)
+        items, buffer, finished = decode_items(decoder, buffer + chunk)
+        for item in items:
+            if isinstance(item, dict):
+                yield item.get('name'), item.get('measurement_unit')
+            else:
+                yield None, None
+        if not chunk and not finished:
+            raise CommandError('Файл JSON оборван или повреждён')
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к ingredients.csv или .json')
+        parser.add_argument('--format', choices=('csv', 'json'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def insert_batch(self, batch):
+        '''Возвращает число добавленных строк пачки
+
+        Строки, которые параллельно добавил другой процесс,
+        ignore_conflicts пропускает молча, поэтому добавленные строки
+        считаются по БД, а не по длине пачки.
+        '''
+        names = Ingredients.objects.filter(name__in=batch.keys())
+        existing = set(names.values_list('name', flat=True))
+        new = [
+            Ingredients(name=name, measurement_unit=unit)
+            for name, unit in batch.items()
+            if name not in existing
+        ]
+        if not new:
+            return 0
+        with transaction.atomic():
+            before = names.count()
+            Ingredients.objects.bulk_create(new, ignore_conflicts=True)
+            return names.count() - before
+
+    def flush(self, batch):
+        added = self.insert_batch(batch)
+        self.inserted += added
+        self.skipped += len(batch) - added
+        batch.clear()
+
+    @staticmethod
+    def get_reader(path, file_format):
+        file_format = file_format or os.path.splitext(
+            path
+        )[1].lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError('Укажите --format csv или --format json')
+        return iter_csv if file_format == 'csv' else iter_json
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = self.get_reader(path, options['format'])
+        self.inserted = self.skipped = self.invalid = 0
+        batch = {}
+        try:
+            file = open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            for line, record in enumerate(reader(file), start=1):
+                name, unit = clean_record(*record)
+                if name is None:
+                    self.invalid += 1
+                    if options['verbosity'] > 1:
+                        self.stderr.write(f'Запись {line} пропущена')
+                elif name in batch:
+                    self.skipped += 1
+                else:
+                    batch[name] = unit
+                    if len(batch) >= options['batch_size']:
+                        self.flush(batch)
+        self.flush(batch)
+        ingredients_index.invalidate()
+        if self.inserted:
+            bump_versions((CATALOG, INGREDIENTS))
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {self.inserted}, уже были: {self.skipped}, '
+            f'с ошибками: {self.invalid}'
+        ))
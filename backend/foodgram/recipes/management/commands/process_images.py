@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.images import process_safely
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Готовит копии изображений рецептов, для которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов, в том числе готовые'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.exclude(processed_image=F('image'))
+        pending = list(recipes.values_list('id', 'image'))
+        rendered = set()
+        for recipe_id, image_name in pending:
+            # Общее для нескольких рецептов изображение пересоздаётся
+            # один раз
+            process_safely(
+                recipe_id, image_name,
+                force=options['all'] and image_name not in rendered
+            )
+            rendered.add(image_name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(pending)}'
+        ))
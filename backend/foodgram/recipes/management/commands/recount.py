@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount
+from recipes.popularity import recount_popularity
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+from users.models import Follow
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков '
+        'и рейтинги рецептов'
+    )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = recount(
+                model.objects.all(), field, related_model, related_field
+            )
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: исправлено {fixed}'
+            )
+        fixed = recount_popularity(Recipe, Favorite, ShoppingCart)
+        self.stdout.write(f'recipe.popularity/trending: исправлено {fixed}')
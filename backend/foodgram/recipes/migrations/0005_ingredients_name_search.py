@@ -0,0 +1,37 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredients_name_prefix '
+    'ON recipes_ingredients (LOWER(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredients_name_trgm '
+    'ON recipes_ingredients USING gin (LOWER(name) gin_trgm_ops)',
+)
+
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_ingredients_name_trgm',
+    'DROP INDEX IF EXISTS recipes_ingredients_name_prefix',
+)
+
+
+def run_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_auto_20230405_1605'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_postgres(POSTGRES_FORWARD),
+            run_postgres(POSTGRES_BACKWARD),
+        ),
+    ]
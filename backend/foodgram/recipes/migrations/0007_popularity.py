@@ -0,0 +1,87 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:24
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+# Настройки и отсчёт времени recipes.popularity на момент миграции
+POPULARITY_WEIGHTS = {
+    'favorites_count': 2,
+    'in_carts_count': 1,
+}
+TRENDING_HALF_LIFE = 60 * 60 * 24 * 3
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def fill_popularity(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(popularity=sum(
+        F(field) * weight for field, weight in POPULARITY_WEIGHTS.items()
+    ))
+    # Логарифм суммы вкладов событий: (максимум, сумма e ** x)
+    sums = {}
+    for field, model_name in (
+        ('favorites_count', 'Favorite'), ('in_carts_count', 'ShoppingCart')
+    ):
+        events = apps.get_model('recipes', model_name).objects.values_list(
+            'recipe_id', 'created'
+        )
+        for recipe_id, created in events.iterator():
+            point = math.log(POPULARITY_WEIGHTS[field]) + math.log(2) * (
+                created - EPOCH
+            ).total_seconds() / TRENDING_HALF_LIFE
+            top, total = sums.get(recipe_id, (point, 0.0))
+            if point > top:
+                top, total = point, total * math.exp(top - point)
+            sums[recipe_id] = (top, total + math.exp(point - top))
+    Recipe.objects.bulk_update(
+        [
+            Recipe(id=recipe_id, trending=max(top + math.log(total), 0.0))
+            for recipe_id, (top, total) in sums.items()
+        ],
+        ('trending',), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Добавлено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг с затуханием'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Добавлено'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
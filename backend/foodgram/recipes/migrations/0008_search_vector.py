@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:27
+
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# Настройка RECIPES_SEARCH_CONFIG на момент миграции
+SEARCH_CONFIG = 'russian'
+
+POSTGRES_FORWARD = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector',
+)
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.aggregates import StringAgg
+
+    for statement in POSTGRES_FORWARD:
+        schema_editor.execute(statement)
+    SearchVector = django.contrib.postgres.search.SearchVector
+    config = SEARCH_CONFIG
+    names = apps.get_model('recipes', 'RecipeIngredients').objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredients__name', ' ')
+    ).values('names')
+    apps.get_model('recipes', 'Recipe').objects.update(
+        search_vector=SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(names), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in POSTGRES_BACKWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_vector, drop_search_index),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator, MinValueValidator
 
+from recipes.storage import recipe_image_storage
+
 
 User = get_user_model()
 
@@ -74,8 +77,15 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipe/images/',
+        storage=recipe_image_storage,
         default=None
     )
+    processed_image = models.CharField(
+        'Изображение, для которого готовы копии',
+        max_length=100,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         'Описание',
     )
@@ -94,11 +104,51 @@ class Recipe(models.Model):
             MinValueValidator(1),
         )
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное',
+        default=0,
+        editable=False,
+        db_index=True
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлено в списки покупок',
+        default=0,
+        editable=False
+    )
+    popularity = models.PositiveIntegerField(
+        'Популярность',
+        default=0,
+        editable=False
+    )
+    trending = models.FloatField(
+        'Рейтинг с затуханием',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(
+                fields=('-popularity', '-id'),
+                name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=('-trending', '-id'),
+                name='recipe_trending_idx'
+            ),
+            models.Index(
+                fields=('cooking_time',),
+                name='recipe_cooking_time_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -131,6 +181,13 @@ class RecipeIngredients(models.Model):
                 name='unique_recipe_ingredients'
             ),
         )
+        # Фильтр ленты по ингредиентам идёт от ингредиента к рецептам
+        indexes = (
+            models.Index(
+                fields=('ingredients', 'recipe'),
+                name='recipe_ingr_ingr_recipe_idx'
+            ),
+        )
 
     def __str__(self):
         return f'Ингредиент {self.ingredients} в рецепте {self.recipe}'
@@ -159,6 +216,13 @@ class RecipeTag(models.Model):
                 name='unique_recipe_tag'
             ),
         )
+        # Фильтр ленты по тегам идёт от тега к рецептам
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='recipe_tag_tag_recipe_idx'
+            ),
+        )
 
     def __str__(self):
         return f'Тэг {self.tag} в рецепте {self.recipe}'
@@ -178,6 +242,10 @@ class Favorite(models.Model):
         related_name='favorite_users',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -206,6 +274,10 @@ class ShoppingCart(models.Model):
         related_name='shop_cart_recipe',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -0,0 +1,126 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from api.cache import POPULARITY
+from api.signals import bump_on_commit
+from recipes.counters import change_counter
+from recipes.models import Recipe
+
+# Отсчёт времени для trending. Рейтинг хранится как логарифм суммы
+# w * 2 ** ((t - EPOCH) / TRENDING_HALF_LIFE) по всем событиям: вклад
+# старых событий относительно новых убывает вдвое за период полураспада,
+# а порядок рецептов по колонке совпадает с порядком по затухающей
+# сумме, поэтому его не нужно пересчитывать со временем.
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+# Нижняя граница доли, остающейся после вычитания события, чтобы
+# ошибка округления не дала логарифм от нуля
+MIN_REMAINDER = 1e-12
+
+
+def weight(field):
+    return settings.POPULARITY_WEIGHTS[field]
+
+
+def trending_point(field, moment):
+    '''Логарифм вклада одного события в trending'''
+    age = (moment - EPOCH).total_seconds()
+    return (
+        math.log(weight(field))
+        + math.log(2) * age / settings.TRENDING_HALF_LIFE
+    )
+
+
+def log_add(point):
+    '''ln(e ** trending + e ** point) без переполнения'''
+    return Greatest(F('trending'), Value(point)) + Ln(
+        1 + Exp(-Abs(F('trending') - Value(point)))
+    )
+
+
+def log_subtract(point):
+    '''ln(e ** trending - e ** point), не ниже нуля'''
+    return Greatest(
+        F('trending') + Ln(Greatest(
+            1 - Exp(Value(point) - F('trending')), Value(MIN_REMAINDER)
+        )),
+        Value(0.0)
+    )
+
+
+def change_activity(recipe_id, field, delta, moment):
+    '''Меняет счётчик рецепта вместе с popularity и trending одним UPDATE
+
+    field — favorites_count или in_carts_count, moment — время добавления
+    строки избранного или корзины (при удалении — её исходное время).
+    '''
+    point = trending_point(field, moment)
+    if delta > 0:
+        trending = log_add(point)
+    else:
+        # Последнее событие рецепта обнуляет рейтинг точно, без ошибки
+        # округления при вычитании
+        others = {
+            other: 0 for other in settings.POPULARITY_WEIGHTS
+            if other != field
+        }
+        trending = Case(
+            When(Q(**{f'{field}__lte': -delta}, **others), then=Value(0.0)),
+            default=log_subtract(point)
+        )
+    updated = change_counter(
+        Recipe.objects.filter(id=recipe_id), field, delta,
+        popularity=F('popularity') + weight(field) * delta,
+        trending=trending
+    )
+    if updated:
+        # UPDATE не отправляет сигналов: списки с ordering=popular и
+        # trending сбрасываются здесь, остальные от счётчиков не зависят
+        bump_on_commit((POPULARITY,))
+    return updated
+
+
+def recount_popularity(recipe_model, favorite_model, cart_model,
+                       batch_size=1000):
+    '''Пересчитывает popularity по счётчикам и trending по времени событий
+
+    Миграция 0007 заполняет колонки тем же расчётом. Возвращает число
+    рецептов с исправленными значениями.
+    '''
+    popularity = sum(
+        F(field) * field_weight
+        for field, field_weight in settings.POPULARITY_WEIGHTS.items()
+    )
+    fixed = set(recipe_model.objects.exclude(
+        popularity=popularity
+    ).values_list('id', flat=True))
+    recipe_model.objects.filter(id__in=fixed).update(popularity=popularity)
+    # Логарифм суммы по рецепту копится потоково: (максимум, сумма e ** x)
+    sums = {}
+    for field, model in (
+        ('favorites_count', favorite_model), ('in_carts_count', cart_model)
+    ):
+        events = model.objects.values_list('recipe_id', 'created')
+        for recipe_id, created in events.iterator():
+            point = trending_point(field, created)
+            top, total = sums.get(recipe_id, (point, 0.0))
+            if point > top:
+                top, total = point, total * math.exp(top - point)
+            sums[recipe_id] = (top, total + math.exp(point - top))
+    changed = []
+    recipes = recipe_model.objects.only('id', 'trending')
+    for recipe in recipes.iterator():
+        top, total = sums.get(recipe.id, (0.0, 1.0))
+        trending = max(top + math.log(total), 0.0)
+        if not math.isclose(recipe.trending, trending, abs_tol=1e-9):
+            recipe.trending = trending
+            changed.append(recipe)
+            fixed.add(recipe.id)
+    recipe_model.objects.bulk_update(
+        changed, ('trending',), batch_size=batch_size
+    )
+    return len(fixed)
@@ -0,0 +1,199 @@
+import bisect
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Lower
+
+from api.cache import INGREDIENTS, get_versions
+from recipes.models import Ingredients, RecipeIngredients
+
+# Короче этого запрос ищется только по началу названия
+MIN_SUBSTRING_LENGTH = 3
+
+
+def search_ingredients_db(queryset, name, limit):
+    '''Поиск для автодополнения в БД: сначала совпадения по началу названия
+
+    Использует индексы по LOWER(name) из миграции 0005.
+    '''
+    name = name.lower()
+    queryset = queryset.annotate(name_lower=Lower('name'))
+    if len(name) < MIN_SUBSTRING_LENGTH:
+        queryset = queryset.filter(name_lower__startswith=name)
+    else:
+        queryset = queryset.filter(name_lower__contains=name)
+    return queryset.annotate(
+        is_substring=Case(
+            When(name_lower__startswith=name, then=Value(False)),
+            default=Value(True),
+            output_field=BooleanField()
+        )
+    ).order_by('is_substring', 'name_lower')[:limit]
+
+
+class IngredientsIndex:
+    '''Индекс ингредиентов в памяти процесса
+
+    Отсортированный список названий в нижнем регистре: совпадения по
+    началу находятся бинарным поиском, по вхождению — проходом по списку.
+    Строится при первом обращении и перестраивается, когда меняется
+    версия справочника ингредиентов в общем кеше (api.cache): её
+    сдвигают сигналы модели Ingredients и load_ingredients в любом
+    процессе.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = None
+        self._items = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+            self._items = None
+
+    def _load(self):
+        version, = get_versions((INGREDIENTS,))
+        with self._lock:
+            if self._names is None or self._version != version:
+                rows = sorted(
+                    (name.lower(), name, pk, unit)
+                    for pk, name, unit in Ingredients.objects.values_list(
+                        'id', 'name', 'measurement_unit'
+                    ).iterator()
+                )
+                self._names = [row[0] for row in rows]
+                self._items = [
+                    Ingredients(id=pk, name=name, measurement_unit=unit)
+                    for _, name, pk, unit in rows
+                ]
+                self._version = version
+            return self._names, self._items
+
+    def search(self, name, limit):
+        names, items = self._load()
+        name = name.lower()
+        result = []
+        position = bisect.bisect_left(names, name)
+        while (
+            position < len(names)
+            and len(result) < limit
+            and names[position].startswith(name)
+        ):
+            result.append(items[position])
+            position += 1
+        if len(name) < MIN_SUBSTRING_LENGTH:
+            return result
+        for position, lower_name in enumerate(names):
+            if len(result) >= limit:
+                break
+            if name in lower_name and not lower_name.startswith(name):
+                result.append(items[position])
+        return result
+
+
+ingredients_index = IngredientsIndex()
+
+
+# Вес совпадения в названии, ингредиентах и описании рецепта при
+# поиске без PostgreSQL — как веса A, B и C у search_vector
+FALLBACK_WEIGHTS = (1.0, 0.4, 0.2)
+
+
+def recipe_search_vector():
+    '''Выражение search_vector: название, названия ингредиентов, описание
+
+    Миграция 0008 заполняет колонку тем же выражением.
+    '''
+    from django.contrib.postgres.aggregates import StringAgg
+
+    config = settings.RECIPES_SEARCH_CONFIG
+    ingredients = RecipeIngredients.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredients__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredients), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipes):
+    '''Пересчитывает search_vector рецептов одним UPDATE
+
+    Вне PostgreSQL колонка не используется и остаётся пустой.
+    '''
+    if connection.vendor != 'postgresql':
+        return 0
+    return recipes.update(search_vector=recipe_search_vector())
+
+
+def search_recipes_fallback(queryset, query):
+    '''Поиск без PostgreSQL: каждое слово запроса должно встретиться
+
+    в названии, описании или названии ингредиента; rank складывается из
+    весов полей, в которых слова нашлись.
+    '''
+    queryset = queryset.annotate(
+        name_lower=Lower('name'), text_lower=Lower('text')
+    )
+    rank = Value(0.0, output_field=FloatField())
+    for number, word in enumerate(query.lower().split()):
+        in_ingredients = f'word_{number}_in_ingredients'
+        queryset = queryset.annotate(**{
+            in_ingredients: Exists(
+                RecipeIngredients.objects.annotate(
+                    name_lower=Lower('ingredients__name')
+                ).filter(recipe=OuterRef('pk'), name_lower__contains=word)
+            )
+        })
+        conditions = (
+            Q(name_lower__contains=word),
+            Q(**{in_ingredients: True}),
+            Q(text_lower__contains=word),
+        )
+        queryset = queryset.filter(
+            conditions[0] | conditions[1] | conditions[2]
+        )
+        for condition, weight in zip(conditions, FALLBACK_WEIGHTS):
+            rank = rank + Case(
+                When(condition, then=Value(weight)),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+    return queryset.annotate(rank=rank)
+
+
+def search_recipes(queryset, query):
+    '''Полнотекстовый поиск рецептов с релевантностью в аннотации rank
+
+    В PostgreSQL запрос идёт по GIN-индексу на search_vector
+    из миграции 0008.
+    '''
+    if connection.vendor != 'postgresql':
+        return search_recipes_fallback(queryset, query)
+    query = SearchQuery(query, config=settings.RECIPES_SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    )
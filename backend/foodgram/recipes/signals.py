@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.cookable import cookable_index
+from recipes.counters import change_counter
+from recipes.images import schedule_processing
+from recipes.models import (
+    Favorite,
+    Ingredients,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    User,
+)
+from recipes.popularity import change_activity
+from recipes.search import ingredients_index, update_search_vectors
+
+
+@receiver(connection_created)
+def sqlite_unicode_lower(sender, connection, **kwargs):
+    '''Встроенный LOWER в SQLite не понимает кириллицу'''
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'LOWER', 1, lambda value: value if value is None else value.lower()
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def count_author_recipes(sender, instance, created=None, **kwargs):
+    '''recipes_count автора при создании и любом удалении рецепта: через
+    API, в админке и каскадом'''
+    if created is False or instance.author_id is None:
+        return
+    change_counter(
+        User.objects.filter(id=instance.author_id), 'recipes_count',
+        1 if created else -1
+    )
+
+
+ACTIVITY_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def count_recipe_activity(sender, instance, created=None, **kwargs):
+    '''Счётчики избранного и корзины вместе с popularity и trending:
+    через API, в админке и каскадом при удалении пользователя'''
+    if created is False:
+        return
+    change_activity(
+        instance.recipe_id, ACTIVITY_FIELDS[sender], 1 if created else -1,
+        instance.created
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def invalidate_ingredients_index(sender, **kwargs):
+    ingredients_index.invalidate()
+
+
+@receiver(post_delete, sender=Ingredients)
+def invalidate_cookable_index(sender, **kwargs):
+    cookable_index.invalidate()
+
+
+def only_image_processed(update_fields):
+    '''Сохранение отметки об обработанном изображении, без правки рецепта'''
+    return update_fields is not None and set(update_fields) == {
+        'processed_image'
+    }
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def refresh_cookable_index(sender, instance, update_fields=None, **kwargs):
+    '''Ингредиенты нового рецепта сохраняются после post_save рецепта'''
+    if only_image_processed(update_fields):
+        return
+    transaction.on_commit(lambda: cookable_index.refresh((instance.id,)))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, update_fields=None,
+                                **kwargs):
+    '''Вектор считается после коммита, когда ингредиенты уже сохранены'''
+    if only_image_processed(update_fields):
+        return
+    transaction.on_commit(lambda: update_search_vectors(
+        Recipe.objects.filter(id=instance.id)
+    ))
+
+
+@receiver((post_save, pre_delete), sender=Ingredients)
+def update_ingredient_recipes_search_vector(sender, instance, created=False,
+                                            **kwargs):
+    '''Переименованный или удаляемый ингредиент меняет векторы рецептов'''
+    if created:
+        return
+    recipe_ids = list(RecipeIngredients.objects.filter(
+        ingredients_id=instance.id
+    ).values_list('recipe_id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(lambda: update_search_vectors(
+            Recipe.objects.filter(id__in=recipe_ids)
+        ))
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    '''Новое или сменившееся изображение уходит в обработку'''
+    image_name = instance.image.name
+    if not image_name or instance.processed_image == image_name:
+        return
+    transaction.on_commit(
+        lambda: schedule_processing(instance.id, image_name)
+    )
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+
+def content_hash(content):
+    '''SHA-256 содержимого, прочитанного по частям'''
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''Файлы называются по хешу содержимого: <каталог>/ab/cd/<sha256>.ext
+
+    Повторная загрузка того же файла не пишет его заново, а возвращает
+    имя уже сохранённого и обновляет время его изменения: gc_images не
+    удаляет файлы моложе --min-age. Содержимое файла с таким именем не
+    меняется, поэтому nginx отдаёт его с неограниченным сроком
+    кеширования.
+    '''
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_hash(content)
+        name = posixpath.join(
+            posixpath.dirname(name), digest[:2], digest[2:4],
+            digest + os.path.splitext(name)[1].lower()
+        )
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
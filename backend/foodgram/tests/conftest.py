@@ -0,0 +1,106 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from api.mixins import catalog_cache
+from recipes.cookable import cookable_index
+from recipes.models import (
+    Ingredients,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    Tag,
+    User,
+)
+from recipes.search import ingredients_index
+from users.models import Follow
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(settings, tmp_path):
+    '''Кеши процесса общие для всех тестов, файлы — во временном каталоге'''
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.IMAGE_PROCESSING_WORKERS = 0
+    cache.clear()
+    catalog_cache.clear()
+    ingredients_index.invalidate()
+    cookable_index.invalidate()
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name='Имя', last_name='Фамилия'
+    )
+
+
+@pytest.fixture
+def user(db):
+    return create_user('user')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                           slug=f'tag{number}')
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredients.objects.create(
+            name=f'ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(10)
+    ]
+
+
+@pytest.fixture
+def make_recipe(tags, ingredients):
+    '''Рецепт с тегами и ингредиентами: make_recipe(author,
+    recipe_tags=[...], amounts={ингредиент: количество})'''
+    def make(author, name='Рецепт', recipe_tags=None, amounts=None):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image='recipe/images/recipe.png'
+        )
+        recipe.tags.set(tags if recipe_tags is None else recipe_tags)
+        if amounts is None:
+            amounts = {ingredient: 100 for ingredient in ingredients[:3]}
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(
+                recipe=recipe, ingredients=ingredient, amount=amount
+            )
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+    return make
+
+
+@pytest.fixture
+def make_user(db):
+    return create_user
+
+
+@pytest.fixture
+def follow(user):
+    def make(author):
+        return Follow.objects.create(user=user, author=author)
+    return make
+
+
+@pytest.fixture
+def add_to_cart(user):
+    def make(recipe):
+        return ShoppingCart.objects.create(user=user, recipe=recipe)
+    return make
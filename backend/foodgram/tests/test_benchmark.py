@@ -0,0 +1,57 @@
+import pytest
+from rest_framework.authtoken.models import Token
+
+from api.benchmark import (
+    USERNAME_PREFIX,
+    DatasetFactory,
+    measure_routes,
+    route_context,
+)
+from api.instrumentation import percentile
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+from users.models import Follow
+
+
+@pytest.mark.parametrize('count, fraction, expected', (
+    (1, 0.95, 1),
+    (10, 0.95, 10),
+    (20, 0.95, 19),
+    (100, 0.95, 95),
+    (101, 0.95, 96),
+    (4, 0.5, 2),
+))
+def test_percentile_nearest_rank(count, fraction, expected):
+    assert percentile(list(range(1, count + 1)), fraction) == expected
+
+
+def test_route_context_requires_unfollowed_author(user, make_user,
+                                                  make_recipe, follow):
+    author = make_user('author')
+    make_recipe(author)
+    follow(author)
+    with pytest.raises(RuntimeError):
+        route_context(user)
+
+    other = make_user('other')
+    assert route_context(user)['author'] == other.id
+
+
+def test_routes_restore_state(db, tmp_path):
+    DatasetFactory(ingredients_path=str(tmp_path / 'нет.csv')).grow_to(100)
+    user = User.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).order_by('id').first()
+    models = (Recipe, Favorite, ShoppingCart, Follow, Token)
+    before = [model.objects.count() for model in models]
+
+    results = measure_routes(user, repeat=2)
+
+    statuses = {name: result['status'] for name, result in results.items()}
+    assert {
+        name: status for name, status in statuses.items() if status >= 400
+    } == {}
+    assert statuses['recipes:create'] == 201
+    assert statuses['recipes:delete'] == 204
+    assert statuses['auth:login'] == 200
+    assert 'recipes:list:anonymous' in statuses
+    assert [model.objects.count() for model in models] == before
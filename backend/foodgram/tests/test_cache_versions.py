@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+
+from api.cache import ALL, VERSION_PREFIX, bump_versions, get_versions
+
+
+def test_versions_expire_in_process_cache(settings, monkeypatch):
+    '''В LocMemCache версии живут CACHE_VERSIONS_TIMEOUT: изменение
+    в другом процессе становится видно не позже этого срока'''
+    settings.CACHE_VERSIONS_TIMEOUT = 30
+    version, = get_versions((ALL,))
+    assert get_versions((ALL,)) == [version]
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 31)
+    assert cache.get(VERSION_PREFIX + ALL) is None
+    assert get_versions((ALL,)) != [version]
+
+
+def test_bumped_versions_expire(settings, monkeypatch):
+    settings.CACHE_VERSIONS_TIMEOUT = 30
+    bump_versions((ALL,))
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 31)
+    assert cache.get(VERSION_PREFIX + ALL) is None
+
+
+def test_shared_cache_versions_do_not_expire(settings, monkeypatch):
+    settings.CACHE_VERSIONS_TIMEOUT = None
+    version, = get_versions((ALL,))
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 365 * 24 * 3600)
+    assert get_versions((ALL,)) == [version]
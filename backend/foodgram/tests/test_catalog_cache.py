@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date, parse_http_date
+
+from recipes.models import Ingredients, Tag
+
+CATALOGS = ('/api/tags/', '/api/ingredients/')
+
+
+@pytest.fixture
+def catalogs(tags, ingredients):
+    return tags, ingredients
+
+
+@pytest.mark.parametrize('url', CATALOGS)
+def test_matching_etag_not_modified_without_queries(client, catalogs, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response['ETag']
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+    assert captured.captured_queries == []
+
+    response = client.get(url, HTTP_IF_NONE_MATCH='"другой"')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('url', CATALOGS)
+def test_last_modified(client, catalogs, url):
+    before = int(time.time())
+    response = client.get(url)
+    last_modified = parse_http_date(response['Last-Modified'])
+    assert before - 1 <= last_modified <= time.time()
+
+    response = client.get(
+        url, HTTP_IF_MODIFIED_SINCE=http_date(last_modified)
+    )
+    assert response.status_code == 304
+    response = client.get(
+        url, HTTP_IF_MODIFIED_SINCE=http_date(last_modified - 60)
+    )
+    assert response.status_code == 200
+
+
+def test_etag_depends_on_query(client, catalogs):
+    assert client.get('/api/ingredients/')['ETag'] != client.get(
+        '/api/ingredients/', {'name': 'ингредиент'}
+    )['ETag']
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url, model', (
+    ('/api/tags/', Tag), ('/api/ingredients/', Ingredients),
+))
+def test_etag_changes_after_save(client, catalogs, url, model):
+    etag = client.get(url)['ETag']
+    item = model.objects.first()
+    item.name = 'Новое название'
+    item.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert 'Новое название' in [entry['name'] for entry in response.json()]
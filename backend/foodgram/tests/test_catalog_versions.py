@@ -0,0 +1,32 @@
+from api.cache import CATALOG, INGREDIENTS, bump_versions
+from recipes.models import Ingredients
+from recipes.search import ingredients_index
+
+
+def add_elsewhere(name):
+    '''Изменение, сделанное другим процессом: сигналы этого процесса
+    не срабатывают, сдвигается только версия в общем кеше'''
+    Ingredients.objects.bulk_create(
+        [Ingredients(name=name, measurement_unit='г')]
+    )
+
+
+def test_ingredients_index_follows_shared_version(ingredients):
+    assert ingredients_index.search('соль', 10) == []
+    add_elsewhere('соль')
+    assert ingredients_index.search('соль', 10) == []
+
+    bump_versions((CATALOG, INGREDIENTS))
+    found = ingredients_index.search('соль', 10)
+    assert [item.name for item in found] == ['соль']
+
+
+def test_catalog_list_follows_shared_version(client, ingredients):
+    response = client.get('/api/ingredients/')
+    assert len(response.json()) == len(ingredients)
+    add_elsewhere('соль')
+    assert len(client.get('/api/ingredients/').json()) == len(ingredients)
+
+    bump_versions((CATALOG, INGREDIENTS))
+    response = client.get('/api/ingredients/')
+    assert len(response.json()) == len(ingredients) + 1
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base as postgresql_base
+from psycopg2 import OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+from foodgram.postgresql import base
+from foodgram.postgresql.pool import ConnectionPool
+
+
+class FakeConnection:
+    isolation_level = 1
+
+    def __init__(self):
+        self.closed = False
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+    def get_transaction_status(self):
+        return self.status
+
+
+@pytest.fixture
+def opened():
+    '''Все соединения, открытые через connect'''
+    return []
+
+
+@pytest.fixture
+def connect(opened):
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return connect
+
+
+def test_pool_reuses_last_released(connect, opened):
+    pool = ConnectionPool(max_size=2, timeout=1, max_idle=60)
+    first, second = pool.acquire(connect), pool.acquire(connect)
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire(connect) is second
+    assert pool.acquire(connect) is first
+    assert len(opened) == 2
+
+
+def test_pool_limits_open_connections(connect):
+    pool = ConnectionPool(max_size=1, timeout=0.01, max_idle=60)
+    connection = pool.acquire(connect)
+    with pytest.raises(OperationalError):
+        pool.acquire(connect)
+    pool.discard(connection)
+    assert connection.closed
+    assert pool.acquire(connect) is not connection
+
+
+def test_pool_closes_broken_and_idle_connections(connect, opened,
+                                                 monkeypatch):
+    pool = ConnectionPool(max_size=3, timeout=1, max_idle=60)
+    in_transaction, failing, stale = (pool.acquire(connect) for _ in range(3))
+    in_transaction.status = TRANSACTION_STATUS_INTRANS
+    pool.release(in_transaction)
+    assert in_transaction.closed
+
+    pool.release(stale)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+    pool.release(failing)
+    assert pool.acquire(connect, check=lambda item: False) is opened[-1]
+    assert stale.closed and failing.closed
+    assert len(opened) == 4
+
+
+def test_pool_connection_error_frees_slot():
+    pool = ConnectionPool(max_size=1, timeout=0.01, max_idle=60)
+
+    def broken():
+        raise OperationalError('нет соединения')
+
+    for _ in range(2):
+        with pytest.raises(OperationalError):
+            pool.acquire(broken)
+
+
+def wrapper(alias='pool_test', conn_max_age=0, health_checks=False,
+            pool=None):
+    options = {} if pool is None else {'pool': pool}
+    return base.DatabaseWrapper({
+        'ENGINE': 'foodgram.postgresql', 'NAME': 'foodgram',
+        'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+        'CONN_MAX_AGE': conn_max_age, 'CONN_HEALTH_CHECKS': health_checks,
+        'OPTIONS': options, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+        'TIME_ZONE': None,
+    }, alias)
+
+
+def test_pool_requires_conn_max_age_zero():
+    with pytest.raises(ImproperlyConfigured):
+        wrapper(conn_max_age=60, pool={'max_size': 2})
+
+
+def test_wrappers_share_process_pool(connect, opened, monkeypatch):
+    monkeypatch.setattr(
+        postgresql_base.DatabaseWrapper, 'get_new_connection',
+        lambda self, conn_params: connect()
+    )
+    first, second = (wrapper(pool={'max_size': 1}) for _ in range(2))
+    try:
+        connection = first.get_new_connection({})
+        first.connection = connection
+        first._close()
+        assert second.get_new_connection({}) is connection
+        assert len(opened) == 1
+    finally:
+        base.close_pool('pool_test')
+
+
+@pytest.fixture
+def checked(monkeypatch):
+    '''Вызовы is_usable; соединение считается оборванным'''
+    calls = []
+
+    def is_usable(self):
+        calls.append(self.connection)
+        return False
+
+    monkeypatch.setattr(base.DatabaseWrapper, 'is_usable', is_usable)
+    monkeypatch.setattr(
+        postgresql_base.DatabaseWrapper, 'ensure_connection',
+        lambda self: None
+    )
+    monkeypatch.setattr(
+        base.DatabaseWrapper, 'close',
+        lambda self: setattr(self, 'connection', None)
+    )
+    return calls
+
+
+def test_health_check_once_per_request(checked):
+    database = wrapper(conn_max_age=60, health_checks=True)
+    connection = database.connection = FakeConnection()
+    database.ensure_connection()
+    assert checked == [connection]
+    assert database.connection is None
+
+    database.connection = FakeConnection()
+    database.ensure_connection()
+    assert len(checked) == 1
+
+    database.health_check_done = False
+    database.in_atomic_block = True
+    database.ensure_connection()
+    assert len(checked) == 1
+
+
+def test_no_health_check_when_disabled(checked):
+    database = wrapper(conn_max_age=60)
+    database.connection = FakeConnection()
+    database.ensure_connection()
+    assert checked == []
@@ -0,0 +1,101 @@
+import pytest
+from django.db import transaction
+
+from recipes.cookable import cookable_index
+
+URL = '/api/recipes/cookable/'
+
+
+def matched(client, ingredients, **params):
+    response = client.get(URL, {
+        'ingredients': ','.join(str(item.id) for item in ingredients),
+        **params
+    })
+    assert response.status_code == 200
+    return [
+        (recipe['id'], recipe['missing_count'])
+        for recipe in response.json()['results']
+    ]
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    '''Число полных перестроений индекса'''
+    calls = []
+    build = cookable_index._build
+
+    def counted():
+        calls.append(1)
+        build()
+
+    monkeypatch.setattr(cookable_index, '_build', counted)
+    return calls
+
+
+@pytest.mark.django_db
+def test_ranking(client, user, make_recipe, ingredients):
+    def recipe(*numbers):
+        return make_recipe(user, amounts={
+            ingredients[number]: 10 for number in numbers
+        })
+
+    full = recipe(0, 1, 2)
+    older_one_missing = recipe(0, 1, 3)
+    one_missing = recipe(1, 2, 4)
+    three_missing = recipe(0, 4, 5, 6)
+    recipe(7)
+    available = ingredients[:3]
+    assert matched(client, available) == [
+        (full.id, 0),
+        (one_missing.id, 1),
+        (older_one_missing.id, 1),
+        (three_missing.id, 3),
+    ]
+    assert matched(client, available, max_missing=1) == [
+        (full.id, 0),
+        (one_missing.id, 1),
+        (older_one_missing.id, 1),
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', (
+    {'ingredients': '1,abc'},
+    {'ingredients': '1', 'max_missing': 'x'},
+    {'ingredients': ''},
+    {},
+    {'ingredients': '1,2,3'},
+))
+def test_bad_params(client, settings, params):
+    settings.COOKABLE_MAX_INGREDIENTS = 2
+    assert client.get(URL, params).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_follows_changes_without_rebuild(
+    settings, client, user_client, user, make_recipe, ingredients, builds
+):
+    settings.COOKABLE_INDEX_TTL = 3600
+    first = make_recipe(user, amounts={ingredients[0]: 10})
+    assert matched(client, ingredients[:1]) == [(first.id, 0)]
+    assert builds == [1]
+
+    with transaction.atomic():
+        second = make_recipe(user, amounts={
+            ingredients[0]: 10, ingredients[1]: 20
+        })
+    assert matched(client, ingredients[:1]) == [(first.id, 0), (second.id, 1)]
+
+    response = user_client.patch(f'/api/recipes/{first.id}/', {
+        'ingredients': [
+            {'id': ingredients[1].id, 'amount': 10},
+            {'id': ingredients[2].id, 'amount': 10},
+        ]
+    }, format='json')
+    assert response.status_code == 200
+    assert matched(client, ingredients[:1]) == [(second.id, 1)]
+    assert matched(client, ingredients[1:3]) == [(first.id, 0), (second.id, 1)]
+
+    second.delete()
+    assert matched(client, ingredients[:3]) == [(first.id, 0)]
+    assert builds == [1]
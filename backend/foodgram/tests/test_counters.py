@@ -0,0 +1,158 @@
+import importlib
+
+import pytest
+from django.apps import apps
+from django.contrib.admin import site
+from django.db import connection
+
+from api.serializers import RecipeSerializer
+from recipes.admin import RecipeAdmin
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+
+
+def counters(user):
+    user.refresh_from_db()
+    return user.recipes_count, user.followers_count
+
+
+def test_recipes_count_follows_any_delete(user, make_user, make_recipe):
+    first, second = make_recipe(user), make_recipe(user)
+    make_recipe(user)
+    assert counters(user) == (3, 0)
+
+    first.delete()
+    Recipe.objects.filter(id=second.id).delete()
+    assert counters(user) == (1, 0)
+
+
+def test_followers_count_follows_cascade(user, make_user, follow):
+    author = make_user('author')
+    follow(author)
+    make_user('other').follower.create(author=author)
+    assert counters(author) == (0, 2)
+
+    User.objects.get(username='other').delete()
+    assert counters(author) == (0, 1)
+    user.delete()
+    assert counters(author) == (0, 0)
+
+
+def activity(recipe):
+    recipe.refresh_from_db()
+    return recipe.favorites_count, recipe.in_carts_count, recipe.popularity
+
+
+def test_activity_follows_cascade(user, make_user, make_recipe):
+    recipe = make_recipe(make_user('author'))
+    other = make_user('other')
+    for owner in (user, other):
+        Favorite.objects.create(user=owner, recipe=recipe)
+        ShoppingCart.objects.create(user=owner, recipe=recipe)
+    assert activity(recipe) == (2, 2, 6)
+
+    other.delete()
+    assert activity(recipe) == (1, 1, 3)
+    Favorite.objects.filter(user=user).delete()
+    ShoppingCart.objects.get(user=user).delete()
+    assert activity(recipe) == (0, 0, 0)
+    assert recipe.trending == 0
+
+
+def test_api_counts_once(user, user_client, make_user, make_recipe):
+    author = make_user('author')
+    url = f'/api/users/{author.id}/subscribe/'
+    assert user_client.post(url).status_code == 201
+    assert counters(author) == (0, 1)
+    assert user_client.delete(url).status_code == 204
+    assert counters(author) == (0, 0)
+
+    recipe = make_recipe(user)
+    url = f'/api/recipes/{recipe.id}/favorite/'
+    assert user_client.post(url).status_code == 201
+    assert activity(recipe) == (1, 0, 2)
+    assert user_client.delete(url).status_code == 204
+    assert activity(recipe) == (0, 0, 0)
+
+    assert user_client.delete(f'/api/recipes/{recipe.id}/').status_code == 204
+    assert counters(user) == (0, 0)
+
+
+def test_migrations_fill_counters(user, make_user, make_recipe):
+    '''Миграции 0006 и 0007 работают с историческими моделями без кода
+    приложения; здесь им передаётся текущий реестр моделей'''
+    author = make_user('author')
+    recipe = make_recipe(author)
+    user.follower.create(author=author)
+    Favorite.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    User.objects.update(recipes_count=0, followers_count=0)
+    Recipe.objects.update(
+        favorites_count=0, in_carts_count=0, popularity=0, trending=0
+    )
+
+    importlib.import_module(
+        'recipes.migrations.0006_counters'
+    ).fill_counters(apps, None)
+    importlib.import_module(
+        'recipes.migrations.0007_popularity'
+    ).fill_popularity(apps, None)
+
+    assert counters(author) == (1, 1)
+    recipe.refresh_from_db()
+    assert (recipe.favorites_count, recipe.in_carts_count) == (1, 1)
+    assert recipe.popularity == 3
+    assert recipe.trending > 0
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='search_vector заполняется только в PostgreSQL'
+)
+@pytest.mark.django_db(transaction=True)
+def test_migration_fills_search_vector(user, make_recipe):
+    recipe = make_recipe(user, name='Борщ')
+    Recipe.objects.update(search_vector=None)
+    with connection.schema_editor() as schema_editor:
+        importlib.import_module(
+            'recipes.migrations.0008_search_vector'
+        ).fill_search_vector(apps, schema_editor)
+    recipe.refresh_from_db()
+    vector = recipe.search_vector.lower()
+    assert "'борщ':1a" in vector
+    assert "'ингредиент':2b,4b,6b" in vector
+
+
+def test_update_keeps_counters_changed_meanwhile(user, user_client,
+                                                 make_user, make_recipe):
+    recipe = make_recipe(make_user('author'))
+    stale = Recipe.objects.get(id=recipe.id)
+    url = f'/api/recipes/{recipe.id}/favorite/'
+    assert user_client.post(url).status_code == 201
+    Recipe.objects.filter(id=recipe.id).update(
+        processed_image=recipe.image.name
+    )
+
+    serializer = RecipeSerializer(
+        stale, data={'name': 'Новое', 'cooking_time': 5}, partial=True
+    )
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+    recipe.refresh_from_db()
+    assert (recipe.name, recipe.cooking_time) == ('Новое', 5)
+    assert (recipe.favorites_count, recipe.popularity) == (1, 2)
+    assert recipe.trending > 0
+    assert recipe.processed_image == recipe.image.name
+
+
+def test_admin_keeps_counters(user, make_recipe):
+    recipe = make_recipe(user)
+    stale = Recipe.objects.get(id=recipe.id)
+    Favorite.objects.create(user=user, recipe=recipe)
+    Recipe.objects.filter(id=recipe.id).update(favorites_count=1)
+
+    stale.name = 'Новое'
+    RecipeAdmin(Recipe, site).save_model(None, stale, None, change=True)
+
+    recipe.refresh_from_db()
+    assert (recipe.name, recipe.favorites_count) == ('Новое', 1)
@@ -0,0 +1,92 @@
+import pytest
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe
+
+# {first} и {second} — id первых двух ингредиентов
+QUERIES = (
+    'tags=tag0&tags=tag1',
+    'tags=tag0&tags=tag1&tags_mode=all',
+    'ingredients={first},{second}',
+)
+
+
+def build(query, ingredients):
+    return query.format(first=ingredients[0].id, second=ingredients[1].id)
+
+
+def filtered(query):
+    filterset = RecipeFilter(
+        data=QueryDict(query), queryset=Recipe.objects.all()
+    )
+    assert filterset.is_valid(), filterset.errors
+    return filterset.qs
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_filters_without_distinct(ingredients, query):
+    sql = str(filtered(build(query, ingredients)).query)
+    assert 'DISTINCT' not in sql.upper()
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_recipe_with_several_matches_listed_once(user, user_client, tags,
+                                                 ingredients, make_recipe,
+                                                 query):
+    # У рецепта все три тега и первые три ингредиента
+    both = make_recipe(user, name='Оба')
+    make_recipe(user, name='Другой', recipe_tags=tags[2:],
+                amounts={ingredients[5]: 100})
+    query = build(query, ingredients)
+
+    assert list(filtered(query)) == [both]
+    data = user_client.get(f'/api/recipes/?{query}').json()
+    assert [recipe['id'] for recipe in data['results']] == [both.id]
+
+
+def test_all_tags_mode_requires_every_tag(user, tags, make_recipe):
+    both = make_recipe(user, recipe_tags=tags[:2])
+    make_recipe(user, recipe_tags=tags[:1])
+    assert list(filtered('tags=tag0&tags=tag1&tags_mode=all')) == [both]
+    assert filtered('tags=tag0&tags=tag1').count() == 2
+
+
+def ids(client, query):
+    data = client.get(f'/api/recipes/?{query}').json()
+    return sorted(recipe['id'] for recipe in data['results'])
+
+
+@pytest.mark.parametrize('query, times', (
+    ('cooking_time_min=5&cooking_time_max=10', [5, 10]),
+    ('cooking_time_min=10', [10, 15]),
+    ('cooking_time_max=10', [5, 10]),
+    ('cooking_time_min=10&cooking_time_max=10', [10]),
+))
+def test_cooking_time_bounds_inclusive(user, client, make_recipe, query,
+                                       times):
+    recipes = {}
+    for cooking_time in (5, 10, 15):
+        recipe = make_recipe(user)
+        Recipe.objects.filter(id=recipe.id).update(cooking_time=cooking_time)
+        recipes[cooking_time] = recipe.id
+    assert ids(client, query) == [recipes[time] for time in times]
+
+
+def test_combined_filters_without_duplicates(user, user_client, make_user,
+                                             tags, make_recipe):
+    author, other = make_user('author'), make_user('other')
+    favorites = [make_recipe(author) for _ in range(2)]
+    make_recipe(author)
+    make_recipe(other).favorite_users.create(user=user)
+    for recipe in favorites:
+        # Несколько строк избранного и тегов на рецепт не размножают его
+        recipe.favorite_users.create(user=user)
+        recipe.favorite_users.create(user=other)
+
+    query = f'is_favorited=1&author={author.id}&tags=tag0&tags=tag1&tags=tag2'
+    assert ids(user_client, query) == sorted(
+        recipe.id for recipe in favorites
+    )
+    data = user_client.get(f'/api/recipes/?{query}').json()
+    assert data['count'] == len(favorites)
@@ -0,0 +1,61 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api import serializers
+from api.serializers import Base64ImageField
+
+
+def data_url(size=(20, 10), image_format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/{image_format.lower()};base64,{encoded}'
+
+
+@pytest.fixture
+def spooled(monkeypatch):
+    '''Все временные файлы, созданные полем'''
+    files = []
+
+    class Tracked(serializers.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            files.append(self)
+
+    monkeypatch.setattr(serializers, 'SpooledTemporaryFile', Tracked)
+    return files
+
+
+def test_wrapped_base64_accepted():
+    header, encoded = data_url().split(',')
+    wrapped = '\n'.join(
+        encoded[position:position + 76]
+        for position in range(0, len(encoded), 76)
+    )
+    file = Base64ImageField().to_internal_value(f' {header},\r\n{wrapped}\n')
+    with Image.open(file) as image:
+        assert image.size == (20, 10)
+
+
+@pytest.mark.parametrize('value', (
+    'data:image/png;base64,!!!!',
+    'data:image/png;base64,' + base64.b64encode(b'not an image').decode(),
+    data_url(size=(200, 200)),
+))
+def test_file_closed_on_errors(settings, spooled, value):
+    settings.RECIPE_IMAGE_MAX_PIXELS = 100 * 100
+    with pytest.raises(ValidationError):
+        Base64ImageField().to_internal_value(value)
+    assert spooled
+    assert all(file.closed for file in spooled)
+
+
+def test_file_closed_when_file_checks_fail(spooled):
+    with pytest.raises(ValidationError):
+        Base64ImageField(max_length=4).to_internal_value(data_url())
+    assert len(spooled) == 1
+    assert spooled[0].closed
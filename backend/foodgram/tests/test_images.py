@@ -0,0 +1,70 @@
+import posixpath
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from recipes.images import make_renditions, rendition_name
+
+IMAGE_NAME = 'recipe/images/ab/cd/image.png'
+
+
+def save_image(mode, color):
+    buffer = BytesIO()
+    Image.new(mode, (400, 300), color).save(buffer, 'PNG')
+    default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+
+
+def rendition(size='thumbnail'):
+    with default_storage.open(rendition_name(IMAGE_NAME, size)) as file:
+        image = Image.open(file)
+        image.load()
+    return image
+
+
+@pytest.mark.parametrize('image_format', ('WEBP', 'PNG'))
+def test_transparency_kept(settings, image_format):
+    settings.RECIPE_IMAGE_FORMAT = image_format
+    save_image('RGBA', (255, 0, 0, 0))
+    make_renditions(IMAGE_NAME)
+    image = rendition()
+    assert image.format == image_format
+    assert image.mode == 'RGBA'
+    assert image.getpixel((0, 0))[3] == 0
+
+
+def test_jpeg_flattened_on_white(settings):
+    settings.RECIPE_IMAGE_FORMAT = 'JPEG'
+    save_image('RGBA', (255, 0, 0, 0))
+    make_renditions(IMAGE_NAME)
+    image = rendition()
+    assert image.mode == 'RGB'
+    assert all(channel > 250 for channel in image.getpixel((0, 0)))
+
+
+def test_opaque_image_stays_rgb(settings):
+    save_image('P', 3)
+    make_renditions(IMAGE_NAME)
+    assert rendition().mode == 'RGB'
+
+
+def test_force_recreates_existing(settings):
+    settings.RECIPE_IMAGE_FORMAT = 'JPEG'
+    save_image('RGB', 'red')
+    make_renditions(IMAGE_NAME)
+    name = rendition_name(IMAGE_NAME, 'detail')
+    size = default_storage.size(name)
+
+    settings.RECIPE_IMAGE_QUALITY = 5
+    make_renditions(IMAGE_NAME)
+    assert default_storage.size(name) == size
+    make_renditions(IMAGE_NAME, force=True)
+    assert default_storage.size(name) < size
+    # Копии перезаписаны, а не сохранены рядом под другими именами
+    _, files = default_storage.listdir(posixpath.dirname(name))
+    assert sorted(files) == sorted(
+        posixpath.basename(rendition_name(IMAGE_NAME, rendition_size))
+        for rendition_size in settings.RECIPE_IMAGE_SIZES
+    )
@@ -0,0 +1,89 @@
+import pytest
+
+from recipes.models import Ingredients
+from api.cache import INGREDIENTS, bump_versions
+from recipes.search import ingredients_index, search_ingredients_db
+
+NAMES = (
+    'Молоко', 'молоко сгущённое', 'Кокосовое молоко', 'Мука',
+    'Сухое МОЛОКО', 'Мак',
+)
+
+
+@pytest.fixture
+def catalog(db):
+    return [
+        Ingredients.objects.create(name=name, measurement_unit='г')
+        for name in NAMES
+    ]
+
+
+def db_names(name, limit=20):
+    return [
+        ingredient.name for ingredient in search_ingredients_db(
+            Ingredients.objects.all(), name, limit
+        )
+    ]
+
+
+def test_db_prefix_before_substring(catalog):
+    assert db_names('МОЛ') == [
+        'Молоко', 'молоко сгущённое', 'Кокосовое молоко', 'Сухое МОЛОКО'
+    ]
+
+
+def test_db_short_query_matches_prefix_only(catalog):
+    assert db_names('мо') == ['Молоко', 'молоко сгущённое']
+    assert db_names('м') == ['Мак', 'Молоко', 'молоко сгущённое', 'Мука']
+
+
+def test_db_limit(catalog):
+    assert db_names('молоко', limit=3) == [
+        'Молоко', 'молоко сгущённое', 'Кокосовое молоко'
+    ]
+
+
+def test_api_uses_db_search(settings, client, catalog):
+    settings.INGREDIENTS_INDEX_ENABLED = False
+    settings.INGREDIENTS_SEARCH_LIMIT = 2
+    data = client.get('/api/ingredients/', {'name': 'Молоко'}).json()
+    assert [item['name'] for item in data] == ['Молоко', 'молоко сгущённое']
+
+
+def index_names(name, limit=20):
+    return [
+        ingredient.name
+        for ingredient in ingredients_index.search(name, limit)
+    ]
+
+
+@pytest.mark.parametrize('name, limit', (
+    ('МОЛ', 20), ('мо', 20), ('м', 20), ('молоко', 3), ('кокос', 20),
+    ('сгущ', 20), ('нет', 20), ('м', 1),
+))
+def test_index_matches_db(catalog, name, limit):
+    assert index_names(name, limit) == db_names(name, limit)
+
+
+def test_index_follows_ingredient_changes(catalog):
+    assert index_names('мол') == db_names('мол')
+    milk = Ingredients.objects.create(name='Молочный соус',
+                                      measurement_unit='г')
+    assert 'Молочный соус' in index_names('мол')
+    milk.name = 'Соус'
+    milk.save()
+    assert 'Молочный соус' not in index_names('мол')
+    assert index_names('соус') == ['Соус']
+    milk.delete()
+    assert index_names('соус') == []
+
+
+def test_index_rebuilt_on_shared_version(catalog):
+    assert index_names('соус') == []
+    # Изменение в другом процессе: строка без сигналов и новая версия
+    Ingredients.objects.bulk_create(
+        (Ingredients(name='Соус', measurement_unit='г'),)
+    )
+    assert index_names('соус') == []
+    bump_versions((INGREDIENTS,))
+    assert index_names('соус') == ['Соус']
@@ -0,0 +1,136 @@
+import json
+import logging
+import re
+
+import pytest
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.test import APIClient
+
+from api.instrumentation import RouteStats, route_stats
+from api.middleware import InstrumentationMiddleware
+from recipes.models import Tag
+
+SERVER_TIMING_RE = re.compile(
+    r'db;dur=(?P<db>[\d.]+);desc="(?P<queries>\d+) queries", '
+    r'app;dur=(?P<app>[\d.]+);desc="view and serializers", '
+    r'render;dur=(?P<render>[\d.]+), total;dur=(?P<total>[\d.]+)$'
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    route_stats.clear()
+    yield
+    route_stats.clear()
+
+
+@pytest.fixture
+def logged(caplog, monkeypatch):
+    '''Записи лога foodgram.requests: в работе он не передаёт их корневому'''
+    monkeypatch.setattr(
+        logging.getLogger('foodgram.requests'), 'propagate', True
+    )
+    return caplog
+
+
+@pytest.fixture
+def enabled(settings):
+    settings.INSTRUMENTATION_ENABLED = True
+    settings.INSTRUMENTATION_N_PLUS_ONE = 5
+
+
+def test_server_timing(client, tags, enabled):
+    response = client.get('/api/tags/')
+    timing = SERVER_TIMING_RE.match(response['Server-Timing'])
+    assert timing is not None, response['Server-Timing']
+    assert int(timing['queries']) == 1
+    durations = {
+        part: float(timing[part]) for part in ('db', 'app', 'render', 'total')
+    }
+    assert durations['db'] > 0
+    assert durations['total'] >= (
+        durations['db'] + durations['app'] + durations['render'] - 0.02
+    )
+    stats = route_stats.snapshot()['GET tag-list']
+    assert (stats['requests'], stats['max_queries']) == (1, 1)
+
+
+def repeated_queries(count):
+    def view(request):
+        for _ in range(count):
+            list(Tag.objects.filter(id__in=[1, 2]))
+        return HttpResponse('')
+    return view
+
+
+@pytest.mark.parametrize('count, n_plus_one', ((5, False), (6, True)))
+def test_repeated_sql_marked_n_plus_one(db, enabled, logged, count,
+                                        n_plus_one):
+    middleware = InstrumentationMiddleware(repeated_queries(count))
+    middleware(RequestFactory().get('/api/tags/'))
+    record, = logged.records
+    line = json.loads(record.getMessage())
+    assert line['queries'] == count
+    assert ('n_plus_one' in line) is n_plus_one
+    assert (record.levelname == 'WARNING') is n_plus_one
+    if n_plus_one:
+        assert list(line['n_plus_one'].values()) == [count]
+    stats = route_stats.snapshot()['GET unresolved']
+    assert stats['n_plus_one'] == int(n_plus_one)
+
+
+def test_route_stats_percentiles(settings):
+    settings.INSTRUMENTATION_WINDOW = 50
+    stats = RouteStats()
+    for number in range(1, 101):
+        stats.add('GET recipes-list', number / 1000, number % 3, number > 98)
+    route = stats.snapshot()['GET recipes-list']
+    # В окне последние 50 замеров: 51..100 мс
+    assert route == {
+        'requests': 100,
+        'window': 50,
+        'p50_ms': 75.0,
+        'p95_ms': 98.0,
+        'p99_ms': 100.0,
+        'avg_queries': 0.98,
+        'max_queries': 2,
+        'n_plus_one': 2,
+    }
+    stats.clear()
+    assert stats.snapshot() == {}
+
+
+def test_stats_only_for_admin(client, user_client, make_user, enabled):
+    url = '/api/instrumentation/'
+    assert client.get(url).status_code == 401
+    assert user_client.get(url).status_code == 403
+    assert user_client.delete(url).status_code == 403
+
+    admin = make_user('admin')
+    admin.is_staff = True
+    admin.save()
+    admin_client = APIClient()
+    admin_client.force_authenticate(admin)
+    data = admin_client.get(url).json()
+    assert data['enabled'] is True
+    assert data['routes']['GET api.views.instrumentation_stats'][
+        'requests'
+    ] == 2
+    assert admin_client.delete(url).status_code == 204
+    assert set(route_stats.snapshot()) == {
+        'DELETE api.views.instrumentation_stats'
+    }
+
+
+def test_disabled_middleware_not_used(client, tags, settings):
+    settings.INSTRUMENTATION_ENABLED = False
+    with pytest.raises(MiddlewareNotUsed):
+        InstrumentationMiddleware(repeated_queries(1))
+    response = client.get('/api/tags/')
+    assert response.status_code == 200
+    assert not response.has_header('Server-Timing')
+    assert route_stats.snapshot() == {}
+    assert connection.execute_wrappers == []
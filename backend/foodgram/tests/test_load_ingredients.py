@@ -0,0 +1,102 @@
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import transaction
+
+from recipes.management.commands import load_ingredients
+from recipes.management.commands.load_ingredients import iter_json
+from recipes.models import Ingredients
+
+RECORDS = [
+    {'name': f'Ингредиент «{number}»', 'measurement_unit': 'г'}
+    for number in range(5)
+]
+
+
+@pytest.mark.parametrize('chunk_size', (1, 3, 7, 64 * 1024))
+def test_json_objects_split_across_chunks(chunk_size):
+    text = ' \n' + json.dumps(RECORDS, ensure_ascii=False, indent=2)
+    assert list(iter_json(io.StringIO(text), chunk_size)) == [
+        (record['name'], record['measurement_unit']) for record in RECORDS
+    ]
+
+
+def test_json_non_objects_are_invalid_records():
+    text = '[{"name": "соль", "measurement_unit": "г"}, 5, "x", []]'
+    assert list(iter_json(io.StringIO(text), 4)) == [
+        ('соль', 'г'), (None, None), (None, None), (None, None)
+    ]
+
+
+@pytest.mark.parametrize('text', (
+    '{"name": "соль"}',
+    '[{"name": "соль", "measurement_unit": "г"}, {"name": ',
+    '[{"name": "соль"} oops]',
+    '',
+))
+def test_json_truncated_or_invalid(text):
+    with pytest.raises(CommandError):
+        list(iter_json(io.StringIO(text), 4))
+
+
+def load(path, **options):
+    stdout = io.StringIO()
+    call_command('load_ingredients', str(path), stdout=stdout, **options)
+    return stdout.getvalue()
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        'соль,г\n'
+        'сахар,г\n'
+        'соль,кг\n'
+        'без единицы\n'
+        ',г\n'
+        'молоко,мл\n',
+        encoding='utf-8'
+    )
+    return path
+
+
+@pytest.mark.django_db
+def test_load_counts_and_rerun(csv_file):
+    assert 'Добавлено: 3, уже были: 1, с ошибками: 2' in load(
+        csv_file, batch_size=2
+    )
+    assert dict(Ingredients.objects.values_list(
+        'name', 'measurement_unit'
+    )) == {'соль': 'г', 'сахар': 'г', 'молоко': 'мл'}
+    assert 'Добавлено: 0, уже были: 4, с ошибками: 2' in load(csv_file)
+    assert Ingredients.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_load_json(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(RECORDS), encoding='utf-8')
+    assert 'Добавлено: 5, уже были: 0, с ошибками: 0' in load(path)
+    assert Ingredients.objects.count() == len(RECORDS)
+
+
+@pytest.mark.django_db
+def test_rows_added_concurrently_not_counted(csv_file, monkeypatch):
+    '''Строка, добавленная другим процессом между проверкой и INSERT,
+    пропускается ignore_conflicts и не считается добавленной'''
+    atomic = transaction.atomic
+
+    @contextlib.contextmanager
+    def racing_atomic():
+        Ingredients.objects.create(name='соль', measurement_unit='г')
+        with atomic():
+            yield
+
+    monkeypatch.setattr(
+        load_ingredients, 'transaction', SimpleNamespace(atomic=racing_atomic)
+    )
+    assert 'Добавлено: 2, уже были: 2, с ошибками: 2' in load(csv_file)
@@ -0,0 +1,129 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api import metrics
+from api.metrics import MetricsFile, metric_key, metrics_path
+
+REQUESTS = 'foodgram_http_requests_total'
+# Заголовок Accept, который отправляет Prometheus
+PROMETHEUS_ACCEPT = (
+    'application/openmetrics-text;version=1.0.0,'
+    'text/plain;version=0.0.4;q=0.5,*/*;q=0.1'
+)
+DURATION = 'foodgram_http_request_duration_seconds'
+
+
+@pytest.fixture
+def enabled(settings, tmp_path, monkeypatch):
+    '''Файлы метрик во временном каталоге, файл процесса открывается
+    заново'''
+    settings.METRICS_ENABLED = True
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+    monkeypatch.setattr(metrics, '_values', None)
+    (tmp_path / 'metrics').mkdir()
+
+
+def samples(name):
+    '''Строки render() с метрикой name: {метки: значение}'''
+    found = {}
+    for line in metrics.render().splitlines():
+        if line.startswith(f'{name}{{') or line.startswith(f'{name} '):
+            labels, value = line[len(name):].rsplit(' ', 1)
+            found[labels] = value
+    return found
+
+
+def test_files_of_processes_summed(enabled):
+    labels = {'view': 'RecipeViewSet', 'method': 'GET', 'status': '200'}
+    first, second = (MetricsFile(metrics_path(pid)) for pid in (101, 202))
+    first.inc(metric_key(REQUESTS, labels), 2)
+    second.inc(metric_key(REQUESTS, labels), 3)
+    second.inc(metric_key(REQUESTS, dict(labels, status='404')), 1)
+
+    assert samples(REQUESTS) == {
+        '{method="GET",status="200",view="RecipeViewSet"}': '5',
+        '{method="GET",status="404",view="RecipeViewSet"}': '1',
+    }
+
+
+def test_file_grows_and_reopens(enabled):
+    path = metrics_path(303)
+    values = MetricsFile(path)
+    keys = [metric_key(REQUESTS, {'view': f'View{number}'})
+            for number in range(2000)]
+    for key in keys:
+        values.inc(key, 1)
+    values.inc(keys[0], 1)
+
+    # Файл завершившегося процесса с тем же pid: счётчики продолжаются
+    reopened = MetricsFile(path)
+    reopened.inc(keys[0], 1)
+    totals = metrics.collect()
+    assert len(totals) == len(keys)
+    assert totals[keys[0]] == 3
+    assert totals[keys[-1]] == 1
+
+
+def test_histogram_buckets_cumulative(enabled):
+    labels = {'view': 'TagViewSet', 'method': 'GET'}
+    for value in (0.003, 0.02, 0.02, 3.0, 60.0):
+        metrics.observe(DURATION, labels, value)
+    other = MetricsFile(metrics_path(404))
+    other.inc(metric_key(f'{DURATION}_bucket', dict(labels, le=0.005)), 1)
+    other.inc(metric_key(f'{DURATION}_sum', labels), 0.001)
+    other.inc(metric_key(f'{DURATION}_count', labels), 1)
+
+    buckets = samples(f'{DURATION}_bucket')
+    prefix = '{method="GET",view="TagViewSet",le='
+    assert [
+        (bound, buckets[f'{prefix}"{bound}"}}'])
+        for bound in ('0.005', '0.01', '0.025', '2.5', '5', '10', '+Inf')
+    ] == [
+        ('0.005', '2'), ('0.01', '2'), ('0.025', '4'), ('2.5', '4'),
+        ('5', '5'), ('10', '5'), ('+Inf', '6'),
+    ]
+    assert len(buckets) == len(metrics.DURATION_BUCKETS)
+    assert samples(f'{DURATION}_count') == {
+        '{method="GET",view="TagViewSet"}': '6'
+    }
+    total, = samples(f'{DURATION}_sum').values()
+    assert float(total) == pytest.approx(63.044)
+
+
+def test_label_values_escaped(enabled):
+    metrics.inc(REQUESTS, {'view': 'a"b\\c\nd'})
+    assert samples(REQUESTS) == {'{view="a\\"b\\\\c\\nd"}': '1'}
+    text = metrics.render()
+    assert f'# TYPE {REQUESTS} counter' in text
+    assert f'# TYPE {DURATION} histogram' in text
+
+
+def test_disabled_writes_nothing(settings, tmp_path, monkeypatch):
+    settings.METRICS_ENABLED = False
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+    monkeypatch.setattr(metrics, '_values', None)
+    metrics.inc(REQUESTS, {'view': 'TagViewSet'})
+    metrics.observe(DURATION, {'view': 'TagViewSet'}, 0.1)
+    assert not (tmp_path / 'metrics').exists()
+
+
+def test_export_only_for_staff(client, user_client, make_user, enabled,
+                               settings):
+    metrics.inc(REQUESTS, {'view': 'TagViewSet'})
+    assert client.get(
+        '/metrics', HTTP_ACCEPT='text/plain'
+    ).status_code == 401
+    assert user_client.get('/metrics').status_code == 403
+
+    admin = make_user('admin')
+    admin.is_staff = True
+    admin.save()
+    admin_client = APIClient()
+    admin_client.force_authenticate(admin)
+    response = admin_client.get('/metrics', HTTP_ACCEPT=PROMETHEUS_ACCEPT)
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert f'{REQUESTS}{{view="TagViewSet"}}' in response.content.decode()
+
+    settings.METRICS_ENABLED = False
+    assert admin_client.get('/metrics').status_code == 404
@@ -0,0 +1,55 @@
+from urllib.parse import urlsplit
+
+import pytest
+
+from recipes.models import Recipe
+
+
+def walk(client, url):
+    '''id рецептов всех страниц по ссылкам next'''
+    ids = []
+    while url:
+        data = client.get(url).json()
+        ids += [recipe['id'] for recipe in data['results']]
+        url = data['next']
+        if url:
+            parts = urlsplit(url)
+            url = f'{parts.path}?{parts.query}'
+    return ids
+
+
+@pytest.fixture
+def recipes(user, make_recipe):
+    recipes = [make_recipe(user, name=f'Рецепт {n}') for n in range(7)]
+    # Одинаковая популярность у большинства рецептов
+    Recipe.objects.filter(id__in=[r.id for r in recipes[:5]]).update(
+        popularity=3
+    )
+    return recipes
+
+
+def test_cursor_by_id(user_client, recipes):
+    data = user_client.get('/api/recipes/?cursor=&limit=3').json()
+    assert 'count' not in data
+    ids = walk(user_client, '/api/recipes/?cursor=&limit=3')
+    assert ids == sorted((recipe.id for recipe in recipes), reverse=True)
+
+
+@pytest.mark.parametrize('ordering', ('popular', 'trending'))
+def test_non_unique_ordering_uses_pages(user_client, recipes, ordering):
+    url = f'/api/recipes/?cursor=&limit=3&ordering={ordering}'
+    data = user_client.get(url).json()
+    assert data['count'] == len(recipes)
+    assert len(data['results']) == 3
+    assert 'page=2' in data['next']
+    ids = walk(user_client, url)
+    assert sorted(ids) == sorted(recipe.id for recipe in recipes)
+
+
+def test_limit_in_page_mode(user_client, recipes):
+    data = user_client.get('/api/recipes/?limit=2&page=2').json()
+    assert [recipe['id'] for recipe in data['results']] == [
+        recipes[4].id, recipes[3].id
+    ]
+    data = user_client.get('/api/recipes/?limit=1000').json()
+    assert len(data['results']) == len(recipes)
@@ -0,0 +1,51 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+
+URL = '/api/recipes/'
+
+
+def ids(client, params):
+    return [
+        recipe['id'] for recipe in client.get(URL, params).json()['results']
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('ordering', ('popular', 'trending'))
+def test_activity_refreshes_cached_ordering(client, user_client, make_user,
+                                            make_recipe, ordering):
+    author = make_user('author')
+    first, second = make_recipe(author), make_recipe(author)
+    assert ids(client, {'ordering': ordering}) == [second.id, first.id]
+
+    url = f'{URL}{first.id}/favorite/'
+    assert user_client.post(url).status_code == 201
+    assert ids(client, {'ordering': ordering}) == [first.id, second.id]
+    assert ids(client, {'ordering': ordering, 'tags': 'tag0'}) == [
+        first.id, second.id
+    ]
+
+    assert user_client.delete(url).status_code == 204
+    assert Recipe.objects.get(id=first.id).popularity == 0
+    assert ids(client, {'ordering': ordering}) == [second.id, first.id]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('filtered', ('', 'tags', 'author'))
+def test_activity_keeps_other_orderings_cached(client, user_client, user,
+                                               make_recipe, filtered):
+    recipe = make_recipe(user)
+    params = {
+        '': {}, 'tags': {'tags': 'tag0'}, 'author': {'author': user.id},
+    }[filtered]
+    assert ids(client, params) == [recipe.id]
+    assert user_client.post(f'{URL}{recipe.id}/favorite/').status_code == 201
+    assert user_client.post(
+        f'{URL}{recipe.id}/shopping_cart/'
+    ).status_code == 201
+    with CaptureQueriesContext(connection) as captured:
+        assert ids(client, params) == [recipe.id]
+    assert captured.captured_queries == []
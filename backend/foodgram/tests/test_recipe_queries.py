@@ -0,0 +1,96 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, ShoppingCart
+
+PAGE_SIZE = 6
+# COUNT, страница рецептов с флагами, ингредиенты, теги, авторы
+LIST_QUERIES = 5
+# Рецепт с флагами, ингредиенты, теги, автор
+DETAIL_QUERIES = 4
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(captured.captured_queries), response.json()
+
+
+@pytest.mark.django_db
+def test_list_query_count_does_not_depend_on_page_size(
+    user, user_client, make_user, make_recipe
+):
+    authors = [make_user(f'author{number}') for number in range(PAGE_SIZE)]
+    make_recipe(authors[0])
+    few, data = count_queries(user_client, '/api/recipes/')
+    assert len(data['results']) == 1
+    for author in authors:
+        recipe = make_recipe(author)
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    many, data = count_queries(user_client, f'/api/recipes/?limit={PAGE_SIZE}')
+    assert len(data['results']) == PAGE_SIZE
+    assert all(
+        recipe['is_favorited'] and recipe['is_in_shopping_cart']
+        for recipe in data['results']
+    )
+    assert many == few == LIST_QUERIES
+
+
+@pytest.mark.django_db
+def test_detail_query_count(user_client, make_user, make_recipe, ingredients):
+    author = make_user('author')
+    small = make_recipe(author)
+    large = make_recipe(author, amounts={
+        ingredient: 50 for ingredient in ingredients
+    })
+    few, _ = count_queries(user_client, f'/api/recipes/{small.id}/')
+    many, data = count_queries(user_client, f'/api/recipes/{large.id}/')
+    assert len(data['ingredients']) == len(ingredients)
+    assert many == few == DETAIL_QUERIES
+
+
+@pytest.mark.django_db
+def test_anonymous_list_flags(client, make_user, make_recipe):
+    make_recipe(make_user('author'))
+    data = client.get('/api/recipes/').json()
+    assert data['results'][0]['is_favorited'] is False
+    assert data['results'][0]['is_in_shopping_cart'] is False
+
+
+def count_sql(client, url):
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    count, = [
+        query['sql'] for query in captured.captured_queries
+        if query['sql'].startswith('SELECT COUNT(*)')
+    ]
+    return count, response.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', ('', '?is_favorited=1&tags=tag0'))
+def test_count_without_flag_subqueries(client, user, user_client, make_user,
+                                       make_recipe, params):
+    recipe = make_recipe(make_user('author'))
+    make_recipe(user)
+    Favorite.objects.create(user=user, recipe=recipe)
+    for current in (client, user_client):
+        sql, data = count_sql(current, f'/api/recipes/{params}')
+        assert 'EXISTS' not in sql.upper()
+        assert 'GROUP BY' not in sql.upper()
+    assert data['count'] == (1 if params else 2)
+    flags = {item['id']: item['is_favorited'] for item in data['results']}
+    assert flags[recipe.id] is True
+
+
+@pytest.mark.django_db
+def test_is_favorited_false_excludes_favorites(user, user_client, make_user,
+                                               make_recipe):
+    favorite, other = make_recipe(user), make_recipe(user)
+    Favorite.objects.create(user=user, recipe=favorite)
+    data = user_client.get('/api/recipes/?is_favorited=0').json()
+    assert [recipe['id'] for recipe in data['results']] == [other.id]
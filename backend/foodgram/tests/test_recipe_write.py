@@ -0,0 +1,145 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, RecipeIngredients
+
+from tests.test_image_field import data_url
+
+URL = '/api/recipes/'
+# Теги и ингредиенты по одному запросу, INSERT рецепта, его кеш и
+# recipes_count автора, INSERT ингредиентов, теги: текущие, уже
+# связанные, INSERT и кеш (2), ответ: ингредиенты, теги и три флага
+CREATE_QUERIES = 16
+# Рецепт с флагами, его ингредиенты, теги и автор, теги и ингредиенты
+# запроса, текущие теги, UPDATE рецепта и его кеш, ответ: ингредиенты
+# и теги
+UPDATE_QUERIES = 11
+
+
+def payload(tags, amounts, **fields):
+    return {
+        'tags': [tag.id for tag in tags],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': amount}
+            for ingredient, amount in amounts.items()
+        ],
+        **fields,
+    }
+
+
+def count_queries(request, *args):
+    with CaptureQueriesContext(connection) as captured:
+        response = request(*args, format='json')
+    assert response.status_code in (200, 201), response.data
+    # SAVEPOINT и RELEASE вокруг transaction.atomic не считаются
+    return len([
+        query for query in captured.captured_queries
+        if 'SAVEPOINT' not in query['sql']
+    ]), response.json()
+
+
+@pytest.mark.django_db
+def test_create_query_count_does_not_depend_on_ingredients(
+    user_client, tags, ingredients
+):
+    few, _ = count_queries(user_client.post, URL, payload(
+        tags[:1], {ingredients[0]: 10},
+        name='Один', text='Описание', cooking_time=5, image=data_url()
+    ))
+    many, data = count_queries(user_client.post, URL, payload(
+        tags, {ingredient: 10 for ingredient in ingredients},
+        name='Много', text='Описание', cooking_time=5, image=data_url()
+    ))
+    assert len(data['ingredients']) == len(ingredients)
+    assert [tag['id'] for tag in data['tags']] == [tag.id for tag in tags]
+    assert many == few == CREATE_QUERIES
+
+
+@pytest.mark.django_db
+def test_unchanged_update_writes_only_recipe(
+    user, user_client, tags, ingredients, make_recipe
+):
+    amounts = {ingredient: 10 for ingredient in ingredients}
+    recipe = make_recipe(user, amounts=amounts)
+    count, _ = count_queries(
+        user_client.patch, f'{URL}{recipe.id}/',
+        payload(tags, amounts, name='Рецепт')
+    )
+    assert count == UPDATE_QUERIES
+
+
+@pytest.mark.django_db
+def test_changed_update_query_count(
+    user, user_client, tags, ingredients, make_recipe
+):
+    recipe = make_recipe(user, recipe_tags=tags[:2], amounts={
+        ingredient: 10 for ingredient in ingredients[:6]
+    })
+    amounts = {ingredient: 20 for ingredient in ingredients[3:]}
+    count, data = count_queries(
+        user_client.patch, f'{URL}{recipe.id}/',
+        payload(tags[1:], amounts, name='Новое')
+    )
+    # Теги: снятие (2 запроса и 4 на кеш) и добавление (2 и 2 на кеш);
+    # ингредиенты: удаление (2 и по запросу кеша на каждую из трёх
+    # строк), UPDATE количеств и INSERT новых
+    assert count == UPDATE_QUERIES + 17
+    assert data['name'] == 'Новое'
+    assert sorted(tag['id'] for tag in data['tags']) == [
+        tag.id for tag in tags[1:]
+    ]
+    assert dict(RecipeIngredients.objects.filter(
+        recipe=recipe
+    ).values_list('ingredients_id', 'amount')) == {
+        ingredient.id: 20 for ingredient in ingredients[3:]
+    }
+    assert Recipe.objects.get(id=recipe.id).name == 'Новое'
+
+
+@pytest.mark.django_db
+def test_unknown_tag(user_client, tags, ingredients):
+    data = payload(
+        tags, {ingredients[0]: 10}, name='Рецепт', text='Описание',
+        cooking_time=5, image=data_url()
+    )
+    data['tags'] = [tags[0].id, 999]
+    response = user_client.post(URL, data, format='json')
+    assert response.status_code == 400
+    assert 'tags' in response.data
+
+
+@pytest.mark.django_db
+def test_image_column_written_only_when_image_changes(
+    user, user_client, make_recipe
+):
+    recipe = make_recipe(user)
+    url = f'{URL}{recipe.id}/'
+    assert user_client.patch(
+        url, {'image': data_url()}, format='json'
+    ).status_code == 200
+    image_name = Recipe.objects.get(id=recipe.id).image.name
+    assert image_name != recipe.image.name
+
+    with CaptureQueriesContext(connection) as captured:
+        user_client.patch(url, {'image': data_url()}, format='json')
+    update, = [
+        query['sql'] for query in captured.captured_queries
+        if query['sql'].startswith('UPDATE "recipes_recipe"')
+    ]
+    assert '"image"' not in update
+    assert Recipe.objects.get(id=recipe.id).image.name == image_name
+
+
+@pytest.mark.django_db
+def test_duplicate_ingredients_rejected(user, user_client, tags, ingredients,
+                                        make_recipe):
+    recipe = make_recipe(user, amounts={ingredients[0]: 10})
+    data = payload(tags, {ingredients[0]: 10})
+    data['ingredients'].append({'id': ingredients[0].id, 'amount': 20})
+    response = user_client.patch(f'{URL}{recipe.id}/', data, format='json')
+    assert response.status_code == 400
+    assert 'ingredients' in response.data
+    assert list(RecipeIngredients.objects.filter(
+        recipe=recipe
+    ).values_list('amount', flat=True)) == [10]
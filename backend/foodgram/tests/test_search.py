@@ -0,0 +1,62 @@
+import pytest
+
+from recipes.models import Ingredients, Recipe
+from recipes.search import search_recipes_fallback
+
+
+@pytest.fixture
+def beet(db):
+    return Ingredients.objects.create(name='Свекла', measurement_unit='г')
+
+
+@pytest.fixture
+def recipes(user, make_recipe, ingredients, beet):
+    '''Слово «свекла» в названии, в ингредиентах, в описании и нигде'''
+    by_name = make_recipe(user, name='Свекла печёная')
+    by_ingredient = make_recipe(user, name='Салат', amounts={
+        beet: 100, ingredients[0]: 50
+    })
+    by_text = make_recipe(user, name='Суп')
+    by_text.text = 'Свекла по вкусу'
+    by_text.save()
+    make_recipe(user, name='Пирог')
+    return by_name, by_ingredient, by_text
+
+
+def ids(queryset):
+    return list(queryset.order_by('-rank', '-id').values_list('id', flat=True))
+
+
+def test_fallback_ranks_name_ingredients_text(recipes):
+    by_name, by_ingredient, by_text = recipes
+    assert ids(search_recipes_fallback(Recipe.objects.all(), 'СВЕКЛА')) == [
+        by_name.id, by_ingredient.id, by_text.id
+    ]
+
+
+def test_fallback_requires_every_word(recipes):
+    by_name, by_ingredient, by_text = recipes
+    assert ids(search_recipes_fallback(
+        Recipe.objects.all(), 'свекла салат'
+    )) == [by_ingredient.id]
+    assert ids(search_recipes_fallback(
+        Recipe.objects.all(), 'свекла суп'
+    )) == [by_text.id]
+    assert ids(search_recipes_fallback(
+        Recipe.objects.all(), 'свекла торт'
+    )) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_search_param_orders_by_relevance(client, recipes):
+    by_name, by_ingredient, by_text = recipes
+    data = client.get('/api/recipes/', {'search': 'свекла'}).json()
+    assert [recipe['id'] for recipe in data['results']] == [
+        by_name.id, by_ingredient.id, by_text.id
+    ]
+    data = client.get(
+        '/api/recipes/', {'search': 'свекла', 'ordering': 'popular'}
+    ).json()
+    assert [recipe['id'] for recipe in data['results']] == [
+        by_text.id, by_ingredient.id, by_name.id
+    ]
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from api.serving import ThreadPoolASGIHandler
+
+
+def scope(method='GET', path='/api/tags/', headers=()):
+    return {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'http_version': '1.1', 'headers': list(headers),
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+    }
+
+
+def call(application, request_scope, body_chunks=(b'',)):
+    '''Ответ приложения ASGI: список сообщений send'''
+    messages = [
+        {'type': 'http.request', 'body': chunk,
+         'more_body': number < len(body_chunks) - 1}
+        for number, chunk in enumerate(body_chunks)
+    ]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(request_scope, receive, send))
+    return sent
+
+
+class EchoApplication:
+    '''WSGI-приложение: тело ответа — тело запроса частями по 4 байта'''
+
+    def __init__(self):
+        self.environ = None
+
+    def __call__(self, environ, start_response):
+        self.environ = environ
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        body = environ['wsgi.input'].read()
+        return [body[start:start + 4] for start in range(0, len(body), 4)]
+
+
+@pytest.fixture
+def wsgi_application():
+    return EchoApplication()
+
+
+@pytest.fixture
+def handler(settings, wsgi_application):
+    settings.ASGI_MAX_BODY_SIZE = 16
+    settings.ASGI_RESPONSE_BUFFER = 8
+    handler = ThreadPoolASGIHandler(wsgi_application)
+    yield handler
+    handler.read_executor.shutdown()
+    handler.executor.shutdown()
+
+
+def test_buffered_response(handler, wsgi_application):
+    sent = call(handler, scope(
+        'POST', '/api/recipes/', [(b'x-test', b'1'), (b'x-test', b'2')]
+    ), (b'abc', b'def'))
+    assert sent == [
+        {'type': 'http.response.start', 'status': 200,
+         'headers': [(b'content-type', b'text/plain')]},
+        {'type': 'http.response.body', 'body': b'abcdef'},
+    ]
+    environ = wsgi_application.environ
+    assert environ['CONTENT_LENGTH'] == '6'
+    assert environ['HTTP_X_TEST'] == '1,2'
+    assert environ['REMOTE_ADDR'] == '127.0.0.1'
+
+
+def test_large_response_streamed(handler):
+    sent = call(handler, scope('POST', '/api/recipes/'), (b'0123456789ab',))
+    assert sent[0]['type'] == 'http.response.start'
+    bodies = [message['body'] for message in sent[1:]]
+    assert bodies == [b'0123456789ab', b'']
+    assert [message.get('more_body') for message in sent[1:]] == [
+        True, None
+    ]
+
+
+@pytest.mark.parametrize('headers, chunks', (
+    ([(b'content-length', b'17')], (b'',)),
+    ([], (b'0123456789', b'0123456789')),
+))
+def test_too_large_body_rejected(handler, wsgi_application, headers, chunks):
+    sent = call(handler, scope('POST', '/api/recipes/', headers), chunks)
+    assert sent[0]['status'] == 413
+    assert wsgi_application.environ is None
+
+
+def test_disconnect_before_body(handler, wsgi_application):
+    sent = call(handler, scope('POST', '/api/recipes/'), ())
+    assert sent == []
+    assert wsgi_application.environ is None
+
+
+@pytest.mark.parametrize('method, path, read_pool', (
+    ('GET', '/api/recipes/', True),
+    ('GET', '/api/recipes/1/', True),
+    ('HEAD', '/api/tags/', True),
+    ('GET', '/api/ingredients/', True),
+    ('POST', '/api/recipes/', False),
+    ('GET', '/api/recipes/download_shopping_cart/', False),
+))
+def test_hot_reads_use_own_pool(handler, method, path, read_pool):
+    executor = handler.get_executor(scope(method, path))
+    assert (executor is handler.read_executor) is read_pool
@@ -0,0 +1,39 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredients
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.mark.django_db
+def test_download_sums_overlapping_ingredients_in_one_query(
+    user_client, make_user, make_recipe, add_to_cart
+):
+    author = make_user('author')
+    flour = Ingredients.objects.create(name='мука', measurement_unit='г')
+    milk = Ingredients.objects.create(name='молоко', measurement_unit='мл')
+    eggs = Ingredients.objects.create(name='яйца', measurement_unit='шт')
+    add_to_cart(make_recipe(author, amounts={flour: 200, milk: 300}))
+    add_to_cart(make_recipe(author, amounts={flour: 150, eggs: 2}))
+    make_recipe(author, amounts={flour: 1000})
+    with CaptureQueriesContext(connection) as captured:
+        response = user_client.get(URL)
+        content = b''.join(response.streaming_content).decode()
+    assert response.status_code == 200
+    assert response.streaming
+    assert 'shopping_cart.txt' in response['Content-Disposition']
+    assert content.splitlines() == [
+        'молоко (мл) - 300',
+        'мука (г) - 350',
+        'яйца (шт) - 2',
+    ]
+    assert len(captured.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_download_empty_cart(user_client):
+    response = user_client.get(URL)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == b''
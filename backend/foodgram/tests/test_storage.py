@@ -0,0 +1,70 @@
+import os
+import time
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from recipes.images import rendition_name
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+HOUR = 60 * 60
+
+
+def save(content, name='recipe/images/upload.PNG'):
+    return recipe_image_storage.save(name, ContentFile(content))
+
+
+def age(name, seconds, storage=recipe_image_storage):
+    moment = time.time() - seconds
+    os.utime(storage.path(name), (moment, moment))
+
+
+def test_same_content_stored_once():
+    name = save(b'image')
+    assert save(b'image', 'recipe/images/other.png') == name
+    assert name.startswith('recipe/images/')
+    assert name.endswith('.png')
+    assert save(b'another image') != name
+    directory, _ = os.path.split(recipe_image_storage.path(name))
+    assert os.listdir(directory) == [os.path.basename(name)]
+
+
+def test_saving_again_refreshes_modified_time():
+    name = save(b'image')
+    age(name, 2 * HOUR)
+    save(b'image')
+    assert time.time() - os.path.getmtime(
+        recipe_image_storage.path(name)
+    ) < HOUR
+
+
+@pytest.mark.django_db
+def test_gc_removes_only_old_unreferenced_files(user, make_recipe):
+    referenced = save(b'referenced')
+    recipe = make_recipe(user)
+    Recipe.objects.filter(id=recipe.id).update(image=referenced)
+    rendition = rendition_name(referenced, 'thumbnail')
+    default_storage.save(rendition, ContentFile(b'rendition'))
+    orphan = save(b'orphan')
+    orphan_rendition = default_storage.save(
+        rendition_name(orphan, 'thumbnail'), ContentFile(b'rendition')
+    )
+    young = save(b'young')
+    for name in (referenced, orphan, young):
+        age(name, 2 * HOUR)
+    for name in (rendition, orphan_rendition):
+        age(name, 2 * HOUR, default_storage)
+    # Снова загруженный файл становится молодым
+    save(b'young')
+
+    call_command('gc_images', min_age=HOUR, stdout=StringIO())
+
+    assert recipe_image_storage.exists(referenced)
+    assert default_storage.exists(rendition)
+    assert recipe_image_storage.exists(young)
+    assert not recipe_image_storage.exists(orphan)
+    assert not default_storage.exists(orphan_rendition)
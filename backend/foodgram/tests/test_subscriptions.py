@@ -0,0 +1,55 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+URL = '/api/users/subscriptions/'
+# COUNT, страница авторов с is_subscribed, рецепты всех авторов страницы
+SUBSCRIPTIONS_QUERIES = 3
+
+
+def count_queries(client, params):
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(URL, params)
+    assert response.status_code == 200
+    return len(captured.captured_queries), response.json()
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_depend_on_authors_and_recipes(
+    user_client, make_user, make_recipe, follow
+):
+    author = make_user('author0')
+    follow(author)
+    make_recipe(author)
+    few, data = count_queries(user_client, {'recipes_limit': 2})
+    assert len(data['results']) == 1
+    authors = [author] + [
+        make_user(f'author{number}') for number in range(1, 5)
+    ]
+    for new_author in authors[1:]:
+        follow(new_author)
+    for current in authors:
+        for number in range(4):
+            make_recipe(current, name=f'Рецепт {number}')
+    many, data = count_queries(user_client, {'recipes_limit': 2})
+    assert len(data['results']) == len(authors)
+    assert many == few == SUBSCRIPTIONS_QUERIES
+
+
+@pytest.mark.django_db
+def test_recipes_limit(user_client, make_user, make_recipe, follow):
+    authors = [make_user(f'author{number}') for number in range(2)]
+    for author in authors:
+        follow(author)
+        for number in range(4):
+            make_recipe(author, name=f'Рецепт {number}')
+    data = user_client.get(URL, {'recipes_limit': 2}).json()
+    for subscription in data['results']:
+        assert subscription['is_subscribed'] is True
+        assert len(subscription['recipes']) == 2
+        # recipes_count не ограничивается recipes_limit
+        assert subscription['recipes_count'] == 4
+        ids = [recipe['id'] for recipe in subscription['recipes']]
+        assert ids == sorted(ids, reverse=True)
+    data = user_client.get(URL).json()
+    assert all(len(item['recipes']) == 4 for item in data['results'])
@@ -0,0 +1,80 @@
+import math
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.popularity import trending_point
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def at(monkeypatch):
+    '''События с заданным временем: created заполняется timezone.now'''
+    now = timezone.now()
+
+    def move(days_ago):
+        moment = now - timedelta(days=days_ago)
+        monkeypatch.setattr(timezone, 'now', lambda: moment)
+        return moment
+    return move
+
+
+def trending(recipe):
+    recipe.refresh_from_db()
+    assert math.isfinite(recipe.trending)
+    return recipe.trending
+
+
+def ordered(client, ordering):
+    response = client.get(URL, {'ordering': ordering})
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_recent_favorite_outranks_older_ones(client, user, make_user,
+                                             make_recipe, at):
+    old, recent = make_recipe(user), make_recipe(user)
+    at(30)
+    for number in range(3):
+        Favorite.objects.create(user=make_user(f'old{number}'), recipe=old)
+    at(0)
+    Favorite.objects.create(user=user, recipe=recent)
+
+    assert ordered(client, 'trending') == [recent.id, old.id]
+    assert ordered(client, 'popular') == [old.id, recent.id]
+
+
+def test_removed_event_subtracts_its_score(user, make_user, make_recipe,
+                                           at):
+    recipe = make_recipe(user)
+    old_moment = at(30)
+    owners = [make_user(f'old{number}') for number in range(2)]
+    for owner in owners:
+        Favorite.objects.create(user=owner, recipe=recipe)
+    at(0)
+    cart = ShoppingCart.objects.create(user=user, recipe=recipe)
+    assert trending(recipe) > trending_point('in_carts_count', cart.created)
+
+    # Вклад свежего события на порядки больше: после вычитания остаётся
+    # точная сумма старых
+    cart.delete()
+    old_point = trending_point('favorites_count', old_moment)
+    assert trending(recipe) == pytest.approx(old_point + math.log(2))
+
+    Favorite.objects.get(user=owners[0]).delete()
+    assert trending(recipe) == pytest.approx(old_point)
+    Favorite.objects.get(user=owners[1]).delete()
+    assert trending(recipe) == 0
+
+
+def test_subtraction_never_goes_negative(user, make_user, make_recipe):
+    recipe = make_recipe(user)
+    for owner in (user, make_user('other')):
+        Favorite.objects.create(user=owner, recipe=recipe)
+    # Рейтинг меньше вклада удаляемого события, например после ручной
+    # правки: результат ограничен нулём, а не NaN
+    Recipe.objects.filter(id=recipe.id).update(trending=0)
+    Favorite.objects.get(user=user).delete()
+    assert trending(recipe) == 0
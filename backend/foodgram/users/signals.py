@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import change_counter
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def count_followers(sender, instance, created=None, **kwargs):
+    '''followers_count автора при подписке и любом удалении подписки:
+    через API, в админке и каскадом при удалении пользователя'''
+    if created is False:
+        return
+    change_counter(
+        User.objects.filter(id=instance.author_id), 'followers_count',
+        1 if created else -1
+    )